@@ -0,0 +1,95 @@
+"""Memory and lookup microbenchmark of WindowsAccount.App against the
+previous representation: a plain dataclass with a per instance dict
+and floating state stored as i3 strings.
+
+Run from the repository root:
+    python -m benchmarks.bench_app
+"""
+import tracemalloc
+from sys import intern
+from dataclasses import dataclass
+from timeit import timeit
+from i3_manager_assets.windows_account import WindowsAccount
+
+
+WINDOWS = 10000
+WORKSPACES = 30
+CLASSES = ['firefox', 'code', 'xfce4-terminal', 'discord', 'mpv', 'steam']
+OUTPUTS = ['HDMI-0', 'DP-0']
+
+
+@dataclass
+class OldApp:
+    w_con_id: int
+    w_win_id: int
+    w_cls: str
+    w_current_ws: int
+    w_floating: str
+    w_current_output: str
+    w_default_output: str|None = None
+    w_default_ws: int = 0
+    w_sharing: bool = True
+    w_parent_id: int|None = None
+    w_terminal_app: bool = False
+
+
+def make_windows(app_cls, floating_on, floating_off, interned: bool) -> list:
+    # classes and outputs are built at runtime, like the ones
+    # coming from i3, so they are distinct string objects
+    store = intern if interned else str
+    return [
+        app_cls(
+            w_con_id=num,
+            w_win_id=num + 1000000,
+            w_cls=store(''.join(CLASSES[num % len(CLASSES)])),
+            w_current_ws=num % WORKSPACES + 1,
+            w_floating=floating_on if num % 7 == 0 else floating_off,
+            w_current_output=store(''.join(OUTPUTS[num % len(OUTPUTS)]))
+        )
+        for num in range(WINDOWS)
+    ]
+
+
+def measure_memory(app_cls, floating_on, floating_off, interned: bool) -> int:
+    tracemalloc.start()
+    windows = make_windows(app_cls, floating_on, floating_off, interned)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del windows
+    return size
+
+
+def old_of_ws(windows: list, ws: int) -> list:
+    # the previous _get_tracked_windows_of_ws(skip_floating=True)
+    return [
+        win for win in windows
+        if win.w_current_ws == ws and win.w_floating not in ['auto_on', 'user_on']
+    ]
+
+
+def new_of_ws(account: WindowsAccount, ws: int) -> list:
+    return account._get_tracked_windows_of_ws(ws, skip_floating=True)
+
+
+def main() -> None:
+    old_memory = measure_memory(OldApp, 'auto_on', 'auto_off', False)
+    new_memory = measure_memory(WindowsAccount.App, True, False, True)
+    print(f'memory for {WINDOWS} windows:')
+    print(f'  dict dataclass    {old_memory / 1024:10.1f} KiB')
+    print(f'  slotted, interned {new_memory / 1024:10.1f} KiB')
+
+    old_windows = make_windows(OldApp, 'auto_on', 'auto_off', False)
+    account = WindowsAccount(None, None)
+    for win in make_windows(WindowsAccount.App, True, False, True):
+        account._track(win)
+    rounds = 20
+    old_time = timeit(lambda: [ old_of_ws(old_windows, ws) for ws in range(1, WORKSPACES + 1) ], number=rounds)
+    new_time = timeit(lambda: [ new_of_ws(account, ws) for ws in range(1, WORKSPACES + 1) ], number=rounds)
+    per_call = rounds * WORKSPACES
+    print('non floating windows of a ws:')
+    print(f'  linear scan       {old_time / per_call * 1e6:10.1f} us')
+    print(f'  indexed, bool     {new_time / per_call * 1e6:10.1f} us')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Copy throughput benchmark: the in-process copy engine against the
+previous `cp -r` subprocess, on a vault-like tree of small files and
+on one big file, and every way of copying the engine knows on it's own.
+The temporary directory decides the filesystem, set TMPDIR to try
+another one, reflinks work only on btrfs and xfs.
+
+Run from the repository root:
+    python -m benchmarks.bench_copy
+"""
+import os
+import shutil
+import subprocess
+import tempfile
+from time import perf_counter
+from i3_manager_assets.additional_funcs import copy_file, copy_paths, COPY_METHODS
+
+
+SMALL_FILES = 2000
+SMALL_SIZE = 4 * 1024
+DIRS = 40
+BIG_SIZE = 256 * 1024 * 1024
+ROUNDS = 3
+
+
+def make_tree(root: str) -> int:
+    """Notes spread over directories, returns bytes written"""
+    for num in range(SMALL_FILES):
+        directory = os.path.join(root, f'dir{num % DIRS}')
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f'note{num}.md'), 'wb') as f:
+            f.write(os.urandom(SMALL_SIZE))
+    return SMALL_FILES * SMALL_SIZE
+
+
+def best_of(func, cleanup) -> float:
+    best = None
+    for _ in range(ROUNDS):
+        cleanup()
+        started = perf_counter()
+        func()
+        seconds = perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    cleanup()
+    return best
+
+
+def show(name: str, seconds: float|None, size: int, files: int=1) -> None:
+    if seconds is None:
+        print(f'  {name:24} not supported here')
+        return
+    print(f'  {name:24} {size / seconds / 1024 / 1024:10.1f} MiB/s {files / seconds:12.0f} files/s')
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'vault')
+        target = os.path.join(tmp, 'backup')
+        size = make_tree(source)
+        sources = [ os.path.join(source, name) for name in os.listdir(source) ]
+
+        def reset() -> None:
+            shutil.rmtree(target, ignore_errors=True)
+            os.makedirs(target)
+
+        print(f'{SMALL_FILES} files of {SMALL_SIZE // 1024} KiB, best of {ROUNDS}:')
+        show('cp -r', best_of(lambda: subprocess.run(['cp', '-r', *sources, target], check=True), reset), size, SMALL_FILES)
+        show('copy_paths', best_of(lambda: copy_paths(sources, target), reset), size, SMALL_FILES)
+
+        big = os.path.join(tmp, 'big')
+        with open(big, 'wb') as f:
+            for _ in range(BIG_SIZE // (1 << 20)):
+                f.write(os.urandom(1 << 20))
+        big_copy = os.path.join(tmp, 'big_copy')
+
+        def drop() -> None:
+            if os.path.exists(big_copy):
+                os.unlink(big_copy)
+
+        print(f'one file of {BIG_SIZE // 1024 // 1024} MiB, best of {ROUNDS}:')
+        show('cp', best_of(lambda: subprocess.run(['cp', big, big_copy], check=True), drop), BIG_SIZE)
+        for method in COPY_METHODS:
+            try:
+                seconds = best_of(lambda: copy_file(big, big_copy, (method,)), drop)
+            except OSError:
+                seconds = None
+            show(method, seconds, BIG_SIZE)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Startup benchmark: import time of the helper modules, with pyautogui
+and pyperclip loaded lazily, against loading them eagerly as before,
+and i3 socket discovery against the previous `i3 --get-socketpath` run.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup
+"""
+import os
+import sys
+import socket
+import subprocess
+import tempfile
+from shutil import which
+from time import perf_counter
+from i3_manager_assets.i3_socket import find_socket_path
+
+
+ROUNDS = 5
+
+
+def import_time(code: str) -> float|None:
+    """The best of ROUNDS fresh interpreters importing something,
+    in seconds, None if it can't be imported here
+    """
+    best = None
+    for _ in range(ROUNDS):
+        started = perf_counter()
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True)
+        seconds = perf_counter() - started
+        if result.returncode != 0:
+            return None
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def show(name: str, seconds: float|None) -> None:
+    if seconds is None:
+        print(f'  {name:28} not available')
+    else:
+        print(f'  {name:28} {seconds * 1000:10.1f} ms')
+
+
+def main() -> None:
+    print(f'fresh interpreter, best of {ROUNDS}:')
+    show('bare python', import_time('pass'))
+    show('lazy additional_funcs', import_time('import i3_manager_assets.additional_funcs'))
+    show('eager pyautogui, pyperclip', import_time(
+        'import i3_manager_assets.additional_funcs, pyperclip, pyautogui'
+    ))
+
+    print('socket discovery:')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'ipc-socket')
+        server = socket.socket(socket.AF_UNIX)
+        server.bind(path)
+        os.environ['I3SOCK'] = path
+        rounds = 100
+        started = perf_counter()
+        for _ in range(rounds):
+            find_socket_path(0)
+        show('I3SOCK', (perf_counter() - started) / rounds)
+        server.close()
+    if which('i3') is not None:
+        started = perf_counter()
+        for _ in range(ROUNDS):
+            subprocess.run(['i3', '--get-socketpath'], capture_output=True)
+        show('i3 --get-socketpath', (perf_counter() - started) / ROUNDS)
+    else:
+        show('i3 --get-socketpath', None)
+
+
+if __name__ == '__main__':
+    main()
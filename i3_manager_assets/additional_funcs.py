@@ -1,22 +1,408 @@
 import subprocess
 import os
-from re import fullmatch, IGNORECASE
+import shutil
+import errno
+import fcntl
+import asyncio
 from .config import (
     BACKUPS, PS2_DIR, COMPOSITOR_PROCESS_NAME,
     COMPOSITOR_SERVICE_NAME, COMPOSITOR_LAUNCH,
     REDSHIFT_SERVICE_NAME, REDSHIFT_PROCESS_NAME,
-    REDSHIFT_LAUNCH, GAMES
+    REDSHIFT_LAUNCH
 )
+from .classifier import CLASSIFIER
+from .notifications import NOTIFIER
+from .proc_table import PROCESSES
+from .x_properties import X_PROPERTIES
+from .backup_index import BackupIndex, FileState, Changes, scan_tree, get_newest_mtime
+from .backup_store import BackupStore
 from datetime import datetime
 from glob import glob
-from time import sleep
+from time import sleep, monotonic
 # from i3ipc import con
 from threading import Timer, Event
-from pyperclip import paste
-from pyautogui import hotkey, keyDown, keyUp, press
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
 
 
 # ======================= backups =======================
+# ioctl which makes a file share data of another one, btrfs and xfs
+FICLONE = 0x40049409
+# the fastest first, each one falls back to the next
+COPY_METHODS = ('reflink', 'copy_file_range', 'sendfile', 'buffered')
+# errors which mean that a way of copying isn't supported here
+_UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF}
+# (source device, target device) -> ways of copying which failed between them
+_UNSUPPORTED_METHODS = {}
+
+
+@dataclass(slots=True)
+class CopyStats:
+    """What a copy did
+
+        files: files copied or linked
+        bytes: bytes of copied files, links don't count
+        errors: paths and what went wrong with them
+    """
+    files: int = 0
+    bytes: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def add(self, other: 'CopyStats') -> None:
+        self.files += other.files
+        self.bytes += other.bytes
+        self.errors += other.errors
+
+
+def _copy_data(src_fd: int, dst_fd: int, methods: tuple[str]=COPY_METHODS) -> int:
+    """Copies file content in the kernel, if it's possible. A reflink
+    doesn't even copy, the file shares blocks with the source until
+    one of them is changed. A way which isn't supported between these
+    two filesystems isn't tried again for them
+
+    Args:
+        src_fd (int): source file, at it's beginning
+        dst_fd (int): target file, empty
+        methods (tuple[str], optional): ways to try, in the order
+
+    Returns:
+        int: bytes copied
+    """
+    devices = (os.fstat(src_fd).st_dev, os.fstat(dst_fd).st_dev)
+    unsupported = _UNSUPPORTED_METHODS.setdefault(devices, set())
+    for method in methods:
+        if method in unsupported:
+            continue
+        copied = 0
+        try:
+            match method:
+                case 'reflink':
+                    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                    return os.fstat(dst_fd).st_size
+                case 'copy_file_range':
+                    while chunk := os.copy_file_range(src_fd, dst_fd, 1 << 30):
+                        copied += chunk
+                    # some filesystems, like procfs or some fuse ones, say
+                    # there is nothing to copy. Then the next way reads it
+                    if not copied and os.fstat(src_fd).st_size:
+                        continue
+                case 'sendfile':
+                    while chunk := os.sendfile(dst_fd, src_fd, None, 1 << 30):
+                        copied += chunk
+                    if not copied and os.fstat(src_fd).st_size:
+                        continue
+                case _:
+                    while chunk := os.read(src_fd, 1 << 20):
+                        copied += os.write(dst_fd, chunk)
+            return copied
+        # only if nothing was copied yet, the next way can start over
+        except (OSError, AttributeError) as error:
+            if copied or getattr(error, 'errno', errno.ENOSYS) not in _UNSUPPORTED:
+                raise
+            unsupported.add(method)
+    raise OSError(errno.ENOSYS, 'No way to copy the file')
+
+
+def copy_file(source: str, target: str, methods: tuple[str]=COPY_METHODS) -> int:
+    """Copies a file with it's mode and times, like cp -p does. The
+    mtime must be kept, backup directories are named by the newest one
+
+    Args:
+        source (str): file to copy
+        target (str): where to, is replaced if exists
+        methods (tuple[str], optional): ways to copy content, in the order
+
+    Returns:
+        int: bytes copied
+    """
+    src_fd = os.open(source, os.O_RDONLY | os.O_CLOEXEC)
+    try:
+        dst_fd = os.open(target, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_CLOEXEC, 0o600)
+        try:
+            copied = _copy_data(src_fd, dst_fd, methods)
+            stat = os.fstat(src_fd)
+            os.fchmod(dst_fd, stat.st_mode & 0o7777)
+            os.utime(dst_fd, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    return copied
+
+
+def copy_files(pairs: list[tuple[str, str]], workers: int=1, unlink: bool=False) -> CopyStats:
+    """Copies files by a pool of threads. Copying of a small file is
+    mostly waiting for the disk, so several of them at once go faster,
+    especially on a spinning disk, which can reorder requests.
+    All directories are created before the copying starts
+
+    Args:
+        pairs (list[tuple[str, str]]): source and target paths
+        workers (int, optional): files to copy at the same time
+        unlink (bool, optional): unlink an existing target first,
+                it can be a hard link, shared with other backups
+
+    Returns:
+        CopyStats: what was copied and what failed
+    """
+    stats = CopyStats()
+    # sorted, so parents are made before their children
+    for directory in sorted({ os.path.dirname(target) for _, target in pairs }):
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as error:
+            stats.errors.append(f'{directory}: {error.strerror or error}')
+
+    def copy_one(pair: tuple[str, str]) -> tuple[int, str|None]:
+        source, target = pair
+        try:
+            if unlink:
+                try:
+                    os.unlink(target)
+                except FileNotFoundError:
+                    pass
+            return copy_file(source, target), None
+        except OSError as error:
+            return 0, f'{source}: {error.strerror or error}'
+
+    if workers > 1 and len(pairs) > 1:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='copy') as pool:
+            results = list(pool.map(copy_one, pairs))
+    else:
+        results = [ copy_one(pair) for pair in pairs ]
+    for copied, error in results:
+        if error is None:
+            stats.files += 1
+            stats.bytes += copied
+        else:
+            stats.errors.append(error)
+    return stats
+
+
+def walk_paths(sources: list[str], errors: list[str]):
+    """Walks files and directories like `cp -r` does, symlinks
+    aren't followed. Parents come before their content
+
+    Args:
+        sources (list[str]): files and directories to walk
+        errors (list[str]): directories which can't be read
+                are added there
+
+    Yields:
+        tuple[str, str, str]: full path, path relative to the
+                directory of sources and the kind: dir, link or file
+    """
+    # full path, relative path, if it's a link and a dir, None if unknown yet
+    stack = [ (source, os.path.basename(os.path.normpath(source)), None, None) for source in sources ]
+    while stack:
+        source, relative, is_link, is_dir = stack.pop()
+        # scandir tells it for free, only the top ones are checked
+        if is_link is None:
+            is_link, is_dir = os.path.islink(source), os.path.isdir(source)
+        if is_link:
+            yield source, relative, 'link'
+        elif is_dir:
+            yield source, relative, 'dir'
+            try:
+                with os.scandir(source) as entries:
+                    stack.extend(
+                        (entry.path, os.path.join(relative, entry.name),
+                         entry.is_symlink(), entry.is_dir(follow_symlinks=False))
+                        for entry in entries
+                    )
+            except OSError as error:
+                errors.append(f'{source}: {error.strerror or error}')
+        else:
+            yield source, relative, 'file'
+
+
+def copy_paths(
+    sources: list[str], target_dir: str, update: bool=False, workers: int=1,
+    changed: set[str]=frozenset(), link_from: str|None=None,
+    linkable: set[str]=frozenset(), unlink: bool=False, prune: bool=False
+) -> CopyStats:
+    """Copies files and directories into a directory, what `cp -r`
+    does, or `cp -ur` if update is set. Symlinks are copied as
+    symlinks. A file which can't be copied doesn't stop the rest
+
+    Args:
+        sources (list[str]): files and directories to copy
+        target_dir (str): directory to put them into
+        update (bool, optional): copy a file only if the target
+                doesn't exist or is older
+        workers (int, optional): files to copy at the same time
+        changed (set[str], optional): relative paths of files which
+                are copied even if update is set and they look older
+        link_from (str | None, optional): a directory with the same
+                layout, files from linkable are hard linked from it
+        linkable (set[str], optional): relative paths of files which
+                are known to be the same in link_from
+        unlink (bool, optional): unlink an existing target first,
+                it can be a hard link, shared with other backups
+        prune (bool, optional): remove from target_dir everything
+                the sources don't have, so it's the same as them
+
+    Returns:
+        CopyStats: what was copied and what failed
+    """
+    stats = CopyStats()
+    # files to copy, they go together when the tree is walked
+    pairs = []
+    walked = list(walk_paths(sources, stats.errors))
+    # first, so nothing is in the way, like a file which became a dir
+    if prune:
+        stats.errors += prune_paths(target_dir, { relative: kind for _, relative, kind in walked })
+    for source, relative, kind in walked:
+        target = os.path.join(target_dir, relative)
+        try:
+            match kind:
+                case 'link':
+                    link = os.readlink(source)
+                    if os.path.lexists(target):
+                        if os.path.islink(target) and os.readlink(target) == link:
+                            continue
+                        os.unlink(target)
+                    os.symlink(link, target)
+                # empty ones have to be there too
+                case 'dir':
+                    os.makedirs(target, exist_ok=True)
+                case _:
+                    if link_from is not None and relative in linkable:
+                        try:
+                            if unlink and os.path.lexists(target):
+                                os.unlink(target)
+                            os.link(os.path.join(link_from, relative), target)
+                            stats.files += 1
+                            continue
+                        # not there anymore or too many links, make a copy then
+                        except OSError:
+                            pass
+                    if update and relative not in changed:
+                        try:
+                            if os.stat(target).st_mtime_ns >= os.stat(source).st_mtime_ns:
+                                continue
+                        except FileNotFoundError:
+                            pass
+                    pairs.append((source, target))
+        except OSError as error:
+            stats.errors.append(f'{source}: {error.strerror or error}')
+    stats.add(copy_files(pairs, workers, unlink))
+    return stats
+
+
+def prune_paths(target_dir: str, keep: dict[str, str]) -> list[str]:
+    """Removes from a directory what isn't in keep, or is there
+    of another kind, like a file which became a directory
+
+    Args:
+        target_dir (str): the directory
+        keep (dict[str, str]): relative path -> dir, link or file
+
+    Returns:
+        list[str]: what couldn't be removed and why
+    """
+    errors = []
+    for target, relative, kind in walk_paths(
+        [ entry.path for entry in os.scandir(target_dir) ], errors
+    ):
+        if keep.get(relative) == kind:
+            continue
+        try:
+            if kind == 'dir':
+                errors += remove_paths([target])
+            else:
+                os.unlink(target)
+        # it was in a directory removed already
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            errors.append(f'{target}: {error.strerror or error}')
+    return errors
+
+
+def source_entries(source_path: str) -> list[str]:
+    """What the backup of a source consists of, the same as
+    `source/*` gives, dot files and dirs on the top are left out"""
+    return glob(os.path.join(source_path, '*'))
+
+
+def remove_paths(paths: list[str]) -> list[str]:
+    """Removes directories with their content, what `rm -r` does
+
+    Args:
+        paths (list[str]): directories to remove
+
+    Returns:
+        list[str]: paths which couldn't be removed and why
+    """
+    errors = []
+    for path in paths:
+        shutil.rmtree(path, onerror=lambda _, failed, info: errors.append(f'{failed}: {info[1]}'))
+    return errors
+
+
+def format_size(size: int) -> str:
+    """Bytes in a human readable form, like 12.3 MiB"""
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if size < 1024 or unit == 'GiB':
+            break
+        size /= 1024
+    return f'{size:.1f} {unit}' if unit != 'B' else f'{size} B'
+
+
+def link_snapshot(
+    source_path: str, previous_path: str|None, snapshot_path: str,
+    states: dict[str, FileState], changes: Changes, workers: int=1
+) -> CopyStats:
+    """Makes a new backup directory with the same content `cp -r`
+    would give, but files which didn't change since the previous backup
+    are hard links to it's files, and only changed ones are copied.
+    Every directory still looks like a full copy, but takes space only
+    for what changed. Files the index doesn't know, like ones in dot
+    dirs, and symlinks are always copied
+
+    Args:
+        source_path (str): what to backup
+        previous_path (str | None): the previous backup directory,
+                the one the index was saved for
+        snapshot_path (str): the new backup directory
+        states (dict[str, FileState]): the source scan
+        changes (Changes): changes since the previous backup
+        workers (int, optional): files to copy at the same time
+
+    Returns:
+        CopyStats: what was copied and what failed
+    """
+    return copy_paths(
+        source_entries(source_path), snapshot_path, workers=workers,
+        link_from=previous_path, linkable=states.keys() - set(changes.changed)
+    )
+
+
+def update_snapshot(
+    source_path: str, snapshot_path: str, changes: Changes, workers: int=1
+) -> CopyStats:
+    """Brings a backup directory up to date with the source, like
+    `cp -ur` does, and removes what is gone from the source. Files of a snapshot
+    can be hard links shared with older backups, so they are never
+    written in place, a changed file is unlinked first and copied anew,
+    otherwise the older backups would change as well
+
+    Args:
+        source_path (str): what to backup
+        snapshot_path (str): the backup directory to update
+        changes (Changes): changes since it was made
+        workers (int, optional): files to copy at the same time
+
+    Returns:
+        CopyStats: what was copied and what failed
+    """
+    return copy_paths(
+        source_entries(source_path), snapshot_path, update=True, workers=workers,
+        changed=set(changes.changed), unlink=True, prune=True
+    )
+
+
 def make_backup(app_cls: str) -> str:
     """Tries to make a backup. Return a result as
     a text message, because a backup can consist of
@@ -26,29 +412,15 @@ def make_backup(app_cls: str) -> str:
         app (str): the app name, which should be found
             in config BACKUPS
     """
-    def get_newest_mtime(source_path: str) -> int:
-        """Returns mtime of a newest file in a given path,
-        rounded to int, ignoring dotfiles/dotdirs"""
-        max_mtime = 0
-        # recursively walk the directory
-        for root, _, files in os.walk(source_path):
-            # ignore dotfiles/dotdirs
-            if not '/.' in root:
-                # iterate over all files in a current dir
-                for file in files:
-                    # if a file is newer, than we met before - update the value
-                    file_mtime = os.path.getmtime(os.path.join(root, file))
-                    if file_mtime > max_mtime:
-                        max_mtime = file_mtime
-        # the floating part isn't needed
-        return int(max_mtime)
-    
-    def remove_dirs_from_tail(dirs: list[str], keep_amount: int) -> None:
+    def remove_dirs_from_tail(dirs: list[str], keep_amount: int) -> list[str]:
         """Shrinks the amount of dirs to the set amount
 
         Args:
             dirs (list[str]): list of dirs names in backup folder
             remove_amount (int): how many to keep
+
+        Returns:
+            list[str]: what couldn't be removed and why
         """
         # turn dirs names to full paths
         full_dirs_paths = [ os.path.join(BACKUPS[app_cls].backup_dir, dir) for dir in dirs ]
@@ -61,10 +433,8 @@ def make_backup(app_cls: str) -> str:
             else:
                 # add dirs for deletion
                 dirs_to_remove.append(dir)
-        # check if there anything to delete
-        if dirs_to_remove:
-            # remove recursively
-            subprocess.run(['rm', '-r', *dirs_to_remove])        
+        # remove recursively
+        return remove_paths(dirs_to_remove)
     
     # just a check to avoid unexpected issues
     if not app_cls in BACKUPS.keys():
@@ -86,9 +456,24 @@ def make_backup(app_cls: str) -> str:
             backup_dir_content.append(dir)
     # for some reason a list comes as a mess
     backup_dir_content.sort()
-    # get the newest mtime of the source location and check if backup not needed
-    newest_mtime = str(get_newest_mtime(BACKUPS[app_cls].source_location))
-    if newest_mtime in backup_dir_content:
+    # look for today directory on the backup dir
+    # it should have timestamp in the name older than today beginning
+    today_beginning = str(int(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()))
+    # today dir sits either on top of the list backup_dir_content or doesn't exist
+    if len(backup_dir_content) and backup_dir_content[-1] > today_beginning:
+        today_dir = backup_dir_content[-1]
+    else:
+        today_dir = None
+    # states of source files, dot dirs aren't even entered. Compared
+    # with the index of the last backup, they tell what exactly changed
+    source_states = scan_tree(BACKUPS[app_cls].source_location)
+    index = BackupIndex.load(BACKUPS[app_cls].backup_dir)
+    changes = index.changes(source_states)
+    # get the newest mtime of the source location and check if backup not needed.
+    # Changes which didn't make the newest mtime newer, like a removed file,
+    # can go only to the today backup, an older one is left as it is
+    newest_mtime = str(get_newest_mtime(source_states))
+    if newest_mtime in backup_dir_content and (not changes or newest_mtime != today_dir):
         return 'No new files found, backup is not required'
     # just in case check if there are any files in a directory
     # makes no sense to backup nothing
@@ -107,23 +492,41 @@ def make_backup(app_cls: str) -> str:
     return_message = ''
     if BACKUPS[app_cls].backup_amount < 0:
         return f'Invalid backup amount. It should be 0(for endless backups) or more'
-    # look for today directory on the backup dir
-    # it should have timestamp in the name older than today beginning
-    today_beginning = str(int(datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()))
-    # today dir sits either on top of the list backup_dir_content or doesn't exist
-    if len(backup_dir_content) and backup_dir_content[-1] > today_beginning:
-        today_dir = backup_dir_content[-1]
-    else:
-        today_dir = None
     # source_files_path = os.path.join(BACKUPS[app_cls].source_location, '*')
-    source_files = glob(os.path.join(BACKUPS[app_cls].source_location, '*'))
+    # for the results, how long the local backup took
+    started = monotonic()
+    source_files = source_entries(BACKUPS[app_cls].source_location)
     full_backup_path = os.path.join(BACKUPS[app_cls].backup_dir, newest_mtime)
+    if BACKUPS[app_cls].dedup:
+        store = BackupStore(BACKUPS[app_cls].backup_dir)
     # if we found today backup, update it
     if today_dir is not None:
-        subprocess.run([
-            'cp', '-ur', *source_files,
-            os.path.join(BACKUPS[app_cls].backup_dir, today_dir)
-        ])
+        # only the manifest is rewritten, the store gets new contents
+        if BACKUPS[app_cls].dedup:
+            copy_stats = store.snapshot(
+                BACKUPS[app_cls].source_location,
+                os.path.join(BACKUPS[app_cls].backup_dir, today_dir),
+                os.path.join(BACKUPS[app_cls].backup_dir, today_dir),
+                changes
+            )
+        # it may share files with older backups
+        elif BACKUPS[app_cls].hard_links:
+            copy_stats = update_snapshot(
+                BACKUPS[app_cls].source_location,
+                os.path.join(BACKUPS[app_cls].backup_dir, today_dir),
+                changes,
+                BACKUPS[app_cls].copy_workers
+            )
+        else:
+            copy_stats = copy_paths(
+                source_files,
+                os.path.join(BACKUPS[app_cls].backup_dir, today_dir),
+                update=True,
+                workers=BACKUPS[app_cls].copy_workers,
+                changed=set(changes.changed),
+                # what is gone from the source, is gone from the backup
+                prune=True
+            )
         return_message += f'Updated local today backup of <b>{app_cls}</b>'
         # also rename the updated dir to reflect the newest file
         os.rename(
@@ -134,8 +537,27 @@ def make_backup(app_cls: str) -> str:
     else:
         # create a new directory
         os.makedirs(full_backup_path)
-        # drop files there
-        subprocess.run(['cp', '-r', *source_files, full_backup_path])
+        # drop files there. The index describes the newest backup,
+        # unchanged files can be taken from it
+        previous_path = os.path.join(BACKUPS[app_cls].backup_dir, backup_dir_content[-1]) if backup_dir_content else None
+        if BACKUPS[app_cls].dedup:
+            copy_stats = store.snapshot(
+                BACKUPS[app_cls].source_location,
+                previous_path,
+                full_backup_path,
+                changes
+            )
+        elif BACKUPS[app_cls].hard_links:
+            copy_stats = link_snapshot(
+                BACKUPS[app_cls].source_location,
+                previous_path,
+                full_backup_path,
+                source_states,
+                changes,
+                BACKUPS[app_cls].copy_workers
+            )
+        else:
+            copy_stats = copy_paths(source_files, full_backup_path, workers=BACKUPS[app_cls].copy_workers)
         return_message += f'Created new local today backup of <b>{BACKUPS[app_cls].name_in_message}</b>'
         # add newly created dir
         backup_dir_content.append(newest_mtime)
@@ -145,7 +567,7 @@ def make_backup(app_cls: str) -> str:
         # we also should check if it's 0, because 0 is for endless amount
         if 0 < BACKUPS[app_cls].backup_amount < 4:
             # keep 3 or less dirs
-            remove_dirs_from_tail(backup_dir_content, BACKUPS[app_cls].backup_amount)
+            copy_stats.errors += remove_dirs_from_tail(backup_dir_content, BACKUPS[app_cls].backup_amount)
         # backup_amount may be big but the amount of backups
         # is still small, 4 or less, just skip such. start from 5
         elif len(backup_dir_content) > 4:
@@ -174,7 +596,20 @@ def make_backup(app_cls: str) -> str:
                 dirs_to_remove += allowed_dirs_to_leave[:len(allowed_dirs_to_leave) + 3 - BACKUPS[app_cls].backup_amount]
             # remove the unnecessary dirs
             if dirs_to_remove:
-                remove_dirs_from_tail(dirs_to_remove, 0)
+                copy_stats.errors += remove_dirs_from_tail(dirs_to_remove, 0)
+    # contents of removed backups and replaced files of the today one
+    if BACKUPS[app_cls].dedup:
+        copy_stats.errors += store.collect_garbage()
+    return_message += (
+        f' ({len(changes.changed)} changed, {len(changes.removed)} removed files)\n'
+        f'{copy_stats.files} files, {format_size(copy_stats.bytes)} in {monotonic() - started:.1f} s'
+    )
+    # the next check compares with what is backed up now. If something
+    # failed, the index is left, so the next backup tries these files again
+    if copy_stats.errors:
+        return_message += '\nFailed:\n' + '\n'.join(copy_stats.errors)
+    else:
+        index.save(source_states)
     # on this point it's established that a backup is required and the
     # local one is created. Let's check the necessity of gdrive backup
     if not BACKUPS[app_cls].sync_gdrive:
@@ -241,10 +676,7 @@ def it_is_a_game(win_cls: str) -> bool:
     Returns:
         bool: verdict
     """
-    for game in GAMES:
-        if fullmatch(game, win_cls, IGNORECASE):
-            return True
-    return False
+    return CLASSIFIER.classify(win_cls).game
 
 
 class CompositorManager:
@@ -385,69 +817,206 @@ class CompositorManager:
         return
 
 
+class AsyncCompositorManager(CompositorManager):
+    """The asyncio version of CompositorManager. Timers are
+    event loop callbacks instead of threads, processes are
+    started and checked without blocking the loop. The
+    postponed_* methods can be called from any thread
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, timer_delay: int=5, off_redshift: bool=True) -> None:
+        super().__init__(timer_delay, off_redshift)
+        self.loop = loop
+        # timer handles, set if ticking
+        self._starter_handle = None
+        self._killer_handle = None
+
+    @staticmethod
+    async def kill_service_or_process_async(
+        service_name: str, process_name: str
+    ) -> None:
+        if service_name:
+            await run_process_async(['systemctl', '--user', 'stop', service_name])
+        elif process_name and await process_searcher_async(process_name):
+            await process_killer_async(process_name)
+
+    @staticmethod
+    async def start_service_or_process_async(
+        service_name: str, process_name: str, process_options: list|None
+    ) -> None:
+        if service_name:
+            await run_process_async(['systemctl', '--user', 'start', service_name])
+        elif (process_name and process_options is not None and
+              not await process_searcher_async(process_name)):
+            # the compositor daemonizes itself, don't wait for it
+            await asyncio.create_subprocess_exec(
+                *process_options,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+
+    async def _kill_task(self) -> None:
+        """Timer's task, kills compositor and redshift"""
+        self._killer_handle = None
+        await self.kill_service_or_process_async(
+            COMPOSITOR_SERVICE_NAME,
+            COMPOSITOR_PROCESS_NAME
+        )
+        if self.off_redshift:
+            await self.kill_service_or_process_async(
+                REDSHIFT_SERVICE_NAME,
+                REDSHIFT_PROCESS_NAME
+            )
+
+    async def _start_task(self) -> None:
+        """Timer's task, starts compositor and redshift"""
+        self._starter_handle = None
+        await self.start_service_or_process_async(
+            COMPOSITOR_SERVICE_NAME,
+            COMPOSITOR_PROCESS_NAME,
+            COMPOSITOR_LAUNCH
+        )
+        if self.off_redshift:
+            await self.start_service_or_process_async(
+                REDSHIFT_SERVICE_NAME,
+                REDSHIFT_PROCESS_NAME,
+                REDSHIFT_LAUNCH
+            )
+
+    def _set_killer(self) -> None:
+        # a game appeared, the starter isn't needed anymore
+        if self._starter_handle is not None:
+            self._starter_handle.cancel()
+            self._starter_handle = None
+        if self._killer_handle is not None:
+            return
+        self._killer_handle = self.loop.call_later(
+            self.timer_delay, lambda: self.loop.create_task(self._kill_task())
+        )
+
+    def _set_starter(self) -> None:
+        # a game disappeared, the killer isn't needed anymore
+        if self._killer_handle is not None:
+            self._killer_handle.cancel()
+            self._killer_handle = None
+        if self._starter_handle is not None:
+            return
+        self._starter_handle = self.loop.call_later(
+            4, lambda: self.loop.create_task(self._start_task())
+        )
+
+    def postponed_compositor_killer(self) -> None:
+        self.loop.call_soon_threadsafe(self._set_killer)
+
+    def postponed_compositor_starter(self) -> None:
+        self.loop.call_soon_threadsafe(self._set_starter)
+
+
 # ======================= misc ==========================
-def sendmessage(title: str, message: str='', timeout: str='10000', urgency: str='normal') -> None:
-    """Sends a message to notification daemon in a separate process.
-    urgency=critical makes a message stay until closed manually,
-    for other message types types don't forget timeout, default
-    timeout is set to 10 seconds"""
-    # uses i3 icon for the message
-    icon = '/usr/share/doc/i3/logo-30.png'
-    subprocess.Popen(['notify-send', '-i', icon, '-t', timeout, '-u', urgency, title, message])
+def sendmessage(title: str, message: str='', timeout: str='10000', urgency: str='normal') -> int:
+    """Sends a message to notification daemon. urgency=critical
+    makes a message stay until closed manually, for other message
+    types types don't forget timeout, default timeout is set to
+    10 seconds. Returns the notification id, 0 if it's unknown"""
+    return NOTIFIER.notify(title, message, timeout, urgency)
+
+def wait_until(predicate, timeout: float, first_delay: float=0.005):
+    """Calls predicate until it returns something meaningful or
+    the time is out. Delays between calls grow twice each time, so
+    a quick result costs nearly nothing and a slow one doesn't make
+    too many calls
+
+    Args:
+        predicate (callable): function without arguments
+        timeout (float): seconds to wait at most
+        first_delay (float, optional): the first delay, seconds
+
+    Returns:
+        the last predicate result
+    """
+    deadline = monotonic() + timeout
+    delay = first_delay
+    while True:
+        result = predicate()
+        remaining = deadline - monotonic()
+        if result or remaining <= 0:
+            return result
+        sleep(min(delay, remaining))
+        delay *= 2
+
 
 def process_searcher(proc_name: str) -> bool:
-    """Searches the process by name, returns True if found"""        
-    try:
-        subprocess.run(['pgrep', '-U', str(os.getuid()), proc_name],  check=True)
-        return True
-    except subprocess.CalledProcessError:
-        return False
-    
+    """Searches the process by name, returns True if found"""
+    return bool(PROCESSES.find(proc_name))
+
 
 def process_killer(proc_name: str) -> None:
-    """Tries to gently kill a process for three times, then tries
-    to terminate it if no success"""
-    try:
-        for _ in range(3):
-            # gentle kills a user owned process
-            if process_searcher(proc_name):
-                subprocess.Popen(['pkill', '-U', str(os.getuid()), proc_name])
-            else:
-                break
-            sleep(1)
-        else:
-            # terminate
-            if process_searcher(proc_name):
-                subprocess.Popen(['pkill', '-9', '-U', str(os.getuid()), proc_name])    
-    except subprocess.CalledProcessError:
-        pass
+    """Gently kills a process, then terminates it if
+    it's still alive after a few seconds"""
+    PROCESSES.kill(proc_name)
 
 
-def pid_searcher(proc_name: str) -> str|None:
+def pid_searcher(proc_name: str) -> list[int]:
     """Searches the given process name among all processes,
-    return it's PID if found or None if no process with such
-    name
+    returns PIDs of found ones, the oldest first
     """
-    try:
-        return subprocess.run(
-            ['pgrep', '-U', str(os.getuid()), proc_name],
-            text=True,
-            capture_output=True,
-            check=True
-        ).stdout.strip()
-    except subprocess.CalledProcessError:
-        return None
+    return [ process.pid for process in PROCESSES.find(proc_name) ]
     
 
-def find_window_by_pid(pid: str) -> int|None:
+async def run_process_async(args: list[str], capture: bool=False) -> tuple[int, str]:
+    """Runs a process without blocking the event loop
+    and waits for it to finish
+
+    Args:
+        args (list[str]): program and it's arguments
+        capture (bool, optional): collect stdout
+
+    Returns:
+        tuple[int, str]: return code and stdout if captured
+    """
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    stdout, _ = await proc.communicate()
+    return proc.returncode, stdout.decode() if stdout else ''
+
+
+async def sendmessage_async(title: str, message: str='', timeout: str='10000', urgency: str='normal') -> int:
+    """The asyncio version of sendmessage, the bus call
+    doesn't block the loop"""
+    return await asyncio.to_thread(NOTIFIER.notify, title, message, timeout, urgency)
+
+
+async def process_searcher_async(proc_name: str) -> bool:
+    """The asyncio version of process_searcher"""
+    return await asyncio.to_thread(process_searcher, proc_name)
+
+
+async def process_killer_async(proc_name: str) -> None:
+    """The asyncio version of process_killer"""
+    await asyncio.to_thread(process_killer, proc_name)
+
+
+def find_window_by_pid(pid: int) -> int|None:
     """Searches window id by process PID. Process may have
     it's window id in it's variables, so the function parses them
     """
-    with open(f'/proc/{pid}/environ', 'r') as f:
-        for var in f.read().split('\0'):
-            var_name, var_val = var.split('=')
-            if var_name == 'WINDOWID':
+    try:
+        with open(f'/proc/{pid}/environ', 'r') as f:
+            env = f.read()
+    # the process has gone or isn't ours
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    for var in env.split('\0'):
+        # values can have '=' too, the name can't
+        var_name, _, var_val = var.partition('=')
+        if var_name == 'WINDOWID':
+            try:
                 return int(var_val)
+            except ValueError:
+                return None
 
 
 def get_client_pid_by_id(win_id: int) -> int|None:
@@ -464,28 +1033,18 @@ def get_client_pid_by_id(win_id: int) -> int|None:
         int|None: parent window id or None if window
                 with win_id has no parent
     """
-    try:
-        # getting something like: 'WM_CLIENT_LEADER(WINDOW): window id # 0x5c00001\n'
-        result = subprocess.run(
-            ['xprop', '-id', str(win_id), 'WM_CLIENT_LEADER'],
-            text=True,
-            capture_output=True,
-            check=True
-        ).stdout
-        # the property can absent
-        if 'not found' in result:
-            return None
-        # clean unnecessary strings in the output, convert hex string to int
-        result = int(result.replace('WM_CLIENT_LEADER(WINDOW): window id # ', '').strip(), 16)
-        if result != win_id:
-            return result
-    except subprocess.CalledProcessError:
-        return None   
+    leader_id = X_PROPERTIES.get(win_id).client_leader
+    if leader_id != win_id:
+        return leader_id
 
 
 def ersatz_clipboard_paste() -> None:
     """Types clipboard content, switches language if required
     """
+    # heavy and needed only here, so loaded on the first use
+    from pyperclip import paste
+    from pyautogui import hotkey, keyDown, keyUp, press
+
     KEY_MAP = {
         'а': 'f', 'б': ',', 'в': 'd', 'г': 'u', 'д': 'l', 'е': 't', 'ё': '`',
         'ж': ';', 'з': 'p', 'и': 'b', 'й': 'q', 'к': 'r', 'л': 'k', 'м': 'v',
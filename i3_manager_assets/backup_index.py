@@ -0,0 +1,161 @@
+import os
+import json
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True, frozen=True)
+class FileState:
+    """What is known about a file without reading it. If all
+    of it is the same, the file is considered unchanged
+
+        size: size in bytes
+        mtime_ns: modification time in nanoseconds
+        inode: inode number, changes when a file is
+                replaced by a new one, like by an atomic save
+    """
+    size: int
+    mtime_ns: int
+    inode: int
+
+
+@dataclass(slots=True)
+class Changes:
+    """Difference between two states of a tree, paths are
+    relative to the tree root
+
+        added: files which weren't there
+        modified: files which differ
+        removed: files which are gone
+    """
+    added: list[str] = field(default_factory=list)
+    modified: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.removed)
+
+    @property
+    def changed(self) -> list[str]:
+        """Files which have to be copied"""
+        return self.added + self.modified
+
+
+def scan_tree(root: str) -> dict[str, FileState]:
+    """Collects states of all files in a tree. Dot directories, like
+    .obsidian or .git, are skipped without descending into them.
+    Symlinks aren't followed
+
+    Args:
+        root (str): the tree root
+
+    Returns:
+        dict[str, FileState]: path relative to the root -> state
+    """
+    states = {}
+    # relative path of a dir -> it's full path
+    stack = [('', root)]
+    while stack:
+        relative, path = stack.pop()
+        try:
+            entries = os.scandir(path)
+        # vanished or no access, like the old walk, just skip it
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                name = os.path.join(relative, entry.name)
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if not entry.name.startswith('.'):
+                            stack.append((name, entry.path))
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        states[name] = FileState(stat.st_size, stat.st_mtime_ns, stat.st_ino)
+                # removed while walking
+                except FileNotFoundError:
+                    continue
+    return states
+
+
+def get_newest_mtime(states: dict[str, FileState]) -> int:
+    """Returns mtime of the newest file, in seconds,
+    0 if there are no files"""
+    return max((state.mtime_ns for state in states.values()), default=0) // 1_000_000_000
+
+
+class BackupIndex:
+    """States of source files at the time of the last backup, kept in
+    the backup directory next to the backups. Comparing it with a fresh
+    scan tells if a backup is needed and which files exactly changed.
+    Backups are named by timestamps, so the file is hidden and it
+    doesn't look like one
+    """
+    FILE_NAME = '.backup_index.json'
+    VERSION = 1
+
+    def __init__(self, backup_dir: str) -> None:
+        self.path = os.path.join(backup_dir, self.FILE_NAME)
+        # relative path -> state
+        self.states = {}
+
+    @classmethod
+    def load(cls, backup_dir: str) -> 'BackupIndex':
+        """Reads the index of a backup directory. If there is no
+        index yet or it's broken, the index is empty, so all files
+        are considered new
+
+        Args:
+            backup_dir (str): the backup directory
+
+        Returns:
+            BackupIndex: the index
+        """
+        index = cls(backup_dir)
+        try:
+            with open(index.path) as f:
+                data = json.load(f)
+            if data.get('version') == cls.VERSION:
+                index.states = {
+                    path: FileState(*state) for path, state in data['files'].items()
+                }
+        except (OSError, ValueError, KeyError, TypeError):
+            index.states = {}
+        return index
+
+    def changes(self, states: dict[str, FileState]) -> Changes:
+        """Compares the index with a fresh scan
+
+        Args:
+            states (dict[str, FileState]): the scan
+
+        Returns:
+            Changes: what changed since the index was saved
+        """
+        changes = Changes()
+        for path, state in states.items():
+            known = self.states.get(path)
+            if known is None:
+                changes.added.append(path)
+            elif known != state:
+                changes.modified.append(path)
+        changes.removed = [ path for path in self.states if path not in states ]
+        return changes
+
+    def save(self, states: dict[str, FileState]) -> None:
+        """Replaces the index with a new scan. Written to a temporary
+        file first, so a crash doesn't leave a broken index
+
+        Args:
+            states (dict[str, FileState]): the scan
+        """
+        self.states = states
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': self.VERSION,
+                'files': {
+                    path: [state.size, state.mtime_ns, state.inode]
+                    for path, state in states.items()
+                }
+            }, f)
+        os.replace(tmp_path, self.path)
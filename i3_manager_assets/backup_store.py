@@ -0,0 +1,289 @@
+import os
+import sys
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from .backup_index import Changes
+
+
+def hash_file(path: str) -> str:
+    """sha256 of a file content, hex. Runs in pool threads
+
+    Args:
+        path (str): the file
+
+    Returns:
+        str: hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BackupStore:
+    """A deduplicating backup format. File contents are kept once, in
+    objects/ of the backup directory, named by their sha256. A backup
+    directory, still named by the newest mtime, has only a manifest,
+    which tells what content every file had, so retention works as for
+    usual backups. Files which didn't change since the previous backup
+    aren't even read, their hashes are taken from it's manifest. Other
+    files are hashed on a pool of threads, hashlib lets the GIL go
+    while it hashes, so they really run at once
+    """
+    OBJECTS_DIR = 'objects'
+    MANIFEST = 'manifest.json'
+    VERSION = 2
+
+    def __init__(self, backup_dir: str, workers: int|None=None) -> None:
+        """
+        Args:
+            backup_dir (str): where backups are
+            workers (int | None, optional): hashing threads,
+                    the number of CPUs if not given
+        """
+        self.backup_dir = backup_dir
+        self.objects_dir = os.path.join(backup_dir, self.OBJECTS_DIR)
+        self.workers = workers or os.cpu_count() or 1
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+    def read_manifest(self, snapshot_path: str) -> dict[str, dict]|None:
+        """Reads what a backup has
+
+        Args:
+            snapshot_path (str): the backup directory
+
+        Returns:
+            dict[str, dict]|None: 'files': relative path -> hash, size,
+                    mtime_ns and mode, 'links': relative path -> where
+                    the symlink points, 'dirs': relative path -> mode.
+                    None if it's not a backup of this format or the
+                    manifest is broken
+        """
+        try:
+            with open(os.path.join(snapshot_path, self.MANIFEST)) as f:
+                data = json.load(f)
+            # the first version knew only files
+            if data.get('version') in (1, self.VERSION):
+                return {
+                    'files': data['files'],
+                    'links': data.get('links', {}),
+                    'dirs': data.get('dirs', {})
+                }
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            pass
+        return None
+
+    def snapshot(
+        self, source_path: str, previous_path: str|None, snapshot_path: str,
+        changes: Changes
+    ):
+        """Makes a backup or updates an existing one. It has what `cp -r`
+        of the source would copy: files, including ones in dot dirs,
+        symlinks and directories, even empty ones. Contents which aren't
+        in the store yet are added, then the manifest is written
+
+        Args:
+            source_path (str): what to backup
+            previous_path (str | None): the previous backup directory,
+                    the one the index was saved for. Can be the same as
+                    snapshot_path, when the today backup is updated
+            snapshot_path (str): the backup directory
+            changes (Changes): changes since the previous backup
+
+        Returns:
+            CopyStats: contents added to the store and what failed
+        """
+        # the copy engine is there, and it needs BACKUPS from config
+        from .additional_funcs import CopyStats, copy_file, walk_paths, source_entries
+        stats = CopyStats()
+        previous = self.read_manifest(previous_path) if previous_path is not None else None
+        previous_files = previous['files'] if previous is not None else {}
+        changed = set(changes.changed)
+        manifest = { 'version': self.VERSION, 'files': {}, 'links': {}, 'dirs': {} }
+        # relative path -> source path and it's stat
+        to_hash = {}
+        for source, relative, kind in walk_paths(source_entries(source_path), stats.errors):
+            try:
+                if kind == 'link':
+                    manifest['links'][relative] = os.readlink(source)
+                    continue
+                stat = os.stat(source, follow_symlinks=False)
+            except OSError as error:
+                stats.errors.append(f'{relative}: {error.strerror or error}')
+                continue
+            if kind == 'dir':
+                manifest['dirs'][relative] = stat.st_mode & 0o7777
+                continue
+            known = previous_files.get(relative)
+            # the index knows better, it checks inodes too. Files
+            # it doesn't know, like in dot dirs, are checked here
+            if (known is not None and relative not in changed and
+                known[1:3] == [stat.st_size, stat.st_mtime_ns]):
+                manifest['files'][relative] = [known[0], stat.st_size, stat.st_mtime_ns, stat.st_mode & 0o7777]
+            else:
+                to_hash[relative] = (source, stat)
+        digests = self._hash_files([ source for source, _ in to_hash.values() ])
+        for (relative, (source, stat)), digest in zip(to_hash.items(), digests):
+            if isinstance(digest, Exception):
+                stats.errors.append(f'{relative}: {getattr(digest, "strerror", None) or digest}')
+                continue
+            try:
+                target = self.object_path(digest)
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    tmp_target = f'{target}.{os.getpid()}.tmp'
+                    stats.bytes += copy_file(source, tmp_target)
+                    # the content is named by the hash, if the file changed
+                    # since it was hashed, the name would lie
+                    current = os.stat(source)
+                    if (current.st_size, current.st_mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                        os.unlink(tmp_target)
+                        stats.errors.append(f'{relative}: changed while backed up')
+                        continue
+                    os.replace(tmp_target, target)
+                    stats.files += 1
+            except OSError as error:
+                stats.errors.append(f'{relative}: {error.strerror or error}')
+                continue
+            manifest['files'][relative] = [digest, stat.st_size, stat.st_mtime_ns, stat.st_mode & 0o7777]
+        os.makedirs(snapshot_path, exist_ok=True)
+        manifest_path = os.path.join(snapshot_path, self.MANIFEST)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + '.tmp', manifest_path)
+        return stats
+
+    def _hash_files(self, paths: list[str]) -> list[str|Exception]:
+        """Hashes files, several at once if there are many
+
+        Returns:
+            list[str|Exception]: hashes or errors, in the same order
+        """
+        if len(paths) < 2 or self.workers < 2:
+            return [ self._hash_or_error(path) for path in paths ]
+        # not processes: forking the threaded daemon may copy a lock
+        # some other thread holds, and the child would wait for it forever
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(paths))) as pool:
+            futures = [ pool.submit(hash_file, path) for path in paths ]
+            results = []
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except OSError as error:
+                    results.append(error)
+            return results
+
+    @staticmethod
+    def _hash_or_error(path: str) -> str|Exception:
+        try:
+            return hash_file(path)
+        except OSError as error:
+            return error
+
+    def collect_garbage(self) -> list[str]:
+        """Removes contents which no backup refers to anymore,
+        after old backups were removed
+
+        Returns:
+            list[str]: what couldn't be removed and why
+        """
+        used = set()
+        for name in os.listdir(self.backup_dir):
+            manifest = self.read_manifest(os.path.join(self.backup_dir, name))
+            if manifest is not None:
+                used.update(digest for digest, *_ in manifest['files'].values())
+        errors = []
+        if not os.path.isdir(self.objects_dir):
+            return errors
+        for prefix in os.scandir(self.objects_dir):
+            if not prefix.is_dir():
+                continue
+            with os.scandir(prefix.path) as entries:
+                for entry in entries:
+                    if prefix.name + entry.name in used:
+                        continue
+                    try:
+                        os.unlink(entry.path)
+                    except OSError as error:
+                        errors.append(f'{entry.path}: {error.strerror or error}')
+            # fails if something is left, then it stays
+            try:
+                os.rmdir(prefix.path)
+            except OSError:
+                pass
+        return errors
+
+    def restore(self, snapshot_path: str, target_dir: str, workers: int=1):
+        """Restores files of a backup to a directory, with their modes
+        and mtimes. A backup of the usual format is just copied
+
+        Args:
+            snapshot_path (str): the backup directory
+            target_dir (str): where to put files, existing
+                    ones are replaced
+            workers (int, optional): files to copy at the same time
+
+        Returns:
+            CopyStats: what was restored and what failed
+        """
+        from .additional_funcs import copy_files, copy_paths
+        manifest = self.read_manifest(snapshot_path)
+        if manifest is None:
+            return copy_paths(
+                [ os.path.join(snapshot_path, name) for name in os.listdir(snapshot_path) ],
+                target_dir, workers=workers
+            )
+        errors = []
+        # parents first
+        for path in sorted(manifest['dirs']):
+            try:
+                os.makedirs(os.path.join(target_dir, path), exist_ok=True)
+            except OSError as error:
+                errors.append(f'{path}: {error.strerror or error}')
+        for path, link in manifest['links'].items():
+            target = os.path.join(target_dir, path)
+            try:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                if os.path.lexists(target):
+                    os.unlink(target)
+                os.symlink(link, target)
+            except OSError as error:
+                errors.append(f'{path}: {error.strerror or error}')
+        # objects are shared, so they are copied, not linked,
+        # and get the mode and mtime of the file
+        stats = copy_files([
+            (self.object_path(digest), os.path.join(target_dir, path))
+            for path, (digest, *_) in manifest['files'].items()
+        ], workers, unlink=True)
+        stats.errors += errors
+        for path, (_, _, mtime_ns, mode) in manifest['files'].items():
+            target = os.path.join(target_dir, path)
+            try:
+                os.chmod(target, mode)
+                os.utime(target, ns=(mtime_ns, mtime_ns))
+            except FileNotFoundError:
+                pass
+        # the last, a read only dir would stop it's content
+        for path, mode in manifest['dirs'].items():
+            try:
+                os.chmod(os.path.join(target_dir, path), mode)
+            except FileNotFoundError:
+                pass
+        return stats
+
+
+# python -m i3_manager_assets.backup_store restore BACKUP_DIR SNAPSHOT TARGET_DIR
+if __name__ == '__main__':
+    if len(sys.argv) != 5 or sys.argv[1] != 'restore':
+        print('Usage: python -m i3_manager_assets.backup_store restore BACKUP_DIR SNAPSHOT TARGET_DIR')
+        sys.exit(2)
+    _, _, backup_dir, snapshot, target_dir = sys.argv
+    result = BackupStore(backup_dir).restore(os.path.join(backup_dir, snapshot), target_dir)
+    print(f'{result.files} files restored')
+    for line in result.errors:
+        print(line)
+    sys.exit(1 if result.errors else 0)
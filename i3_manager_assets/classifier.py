@@ -0,0 +1,99 @@
+import re
+from functools import lru_cache
+from dataclasses import dataclass
+from .config import (
+    DEFAULT_ASSIGNMENT, NON_BANISHING_APPS, GAMES,
+    BACKUPS, VIDEOPLAYER, TERMINALS, DefaultAssignment
+)
+
+
+@dataclass(frozen=True)
+class WindowClass:
+    """Everything the config says about one window class
+
+        assignment: default assignment of the class if any
+        non_banishing: the class is among NON_BANISHING_APPS
+        game: the class matches some of GAMES
+        backup: the key of BACKUPS if the app requires a backup
+        videoplayer: the class is the VIDEOPLAYER
+        terminal: the class is a terminal emulator from TERMINALS
+    """
+    assignment: DefaultAssignment|None = None
+    non_banishing: bool = False
+    game: bool = False
+    backup: str|None = None
+    videoplayer: bool = False
+    terminal: bool = False
+
+
+class WindowClassifier:
+    """All class patterns from the config, compiled once. A class
+    is checked against all of them in one go and the verdict is
+    cached, so the same class is never matched twice while it
+    stays in the cache
+    """
+    # how many distinct classes to remember
+    CACHE_SIZE = 256
+
+    def __init__(self) -> None:
+        def compile_all(patterns) -> list[re.Pattern]:
+            return [ re.compile(pattern, re.IGNORECASE) for pattern in patterns ]
+
+        self._assignments = [
+            (re.compile(def_ass.name, re.IGNORECASE), def_ass) for def_ass in DEFAULT_ASSIGNMENT
+        ]
+        self._non_banishing = compile_all(NON_BANISHING_APPS)
+        self._games = compile_all(GAMES)
+        self._backups = [ (re.compile(key, re.IGNORECASE), key) for key in BACKUPS ]
+        self._videoplayer = re.compile(VIDEOPLAYER, re.IGNORECASE)
+        self._terminals = compile_all(TERMINALS)
+        # bounded caches, least recently used classes are evicted
+        self._classify = lru_cache(maxsize=self.CACHE_SIZE)(self._classify_uncached)
+        self._matches = lru_cache(maxsize=self.CACHE_SIZE)(self._matches_uncached)
+
+    def classify(self, win_cls: str) -> WindowClass:
+        """Returns all categories of a window class
+
+        Args:
+            win_cls (str): window class
+
+        Returns:
+            WindowClass: the verdict
+        """
+        # matching ignores case anyway, so lowercase makes more hits
+        return self._classify(win_cls.lower())
+
+    def matches(self, pattern: str, win_cls: str) -> bool:
+        """Cached case insensitive fullmatch for patterns which
+        aren't categories, like '^steam$'
+
+        Args:
+            pattern (str): regex pattern
+            win_cls (str): window class
+
+        Returns:
+            bool: verdict
+        """
+        return self._matches(pattern, win_cls.lower())
+
+    def _classify_uncached(self, win_cls: str) -> WindowClass:
+        return WindowClass(
+            assignment=next((
+                def_ass for regex, def_ass in self._assignments if regex.fullmatch(win_cls)
+            ), None),
+            non_banishing=any(regex.fullmatch(win_cls) for regex in self._non_banishing),
+            game=any(regex.fullmatch(win_cls) for regex in self._games),
+            backup=next((
+                key for regex, key in self._backups if regex.fullmatch(win_cls)
+            ), None),
+            videoplayer=self._videoplayer.fullmatch(win_cls) is not None,
+            terminal=any(regex.fullmatch(win_cls) for regex in self._terminals)
+        )
+
+    @staticmethod
+    def _matches_uncached(pattern: str, win_cls: str) -> bool:
+        return re.fullmatch(pattern, win_cls, re.IGNORECASE) is not None
+
+
+# the only instance, all modules use it
+CLASSIFIER = WindowClassifier()
@@ -26,6 +26,19 @@ class Backup:
         required
     gdrive_args: a list of arguments to pass to
         gdrive sync script
+    hard_links: a new backup hard links files which
+        didn't change from the previous one and copies
+        only changed files, so every backup takes space
+        only for it's changes. Backups must be on one
+        filesystem
+    copy_workers: how many files are copied at the
+        same time. Sources of thousands of small files
+        are copied faster by several workers
+    dedup: backups keep file contents once, by hash,
+        in objects/ of backup_dir, a backup is only
+        a manifest of them. Instead of hard_links.
+        Restore by `python -m i3_manager_assets.backup_store
+        restore BACKUP_DIR SNAPSHOT TARGET_DIR`
     """
     # pun any of these two to None to turn off gdrive backup
     gdrive_python_path = expanduser('~/Documents/Scripts/gdrive_manage/venv/bin/python')
@@ -39,7 +52,10 @@ class Backup:
         backup_amount: int = 4,
         old_backup_interval: timedelta = timedelta(weeks=1),
         sync_gdrive: bool = False,
-        gdrive_args: list|None = None        
+        gdrive_args: list|None = None,
+        hard_links: bool = False,
+        copy_workers: int = 1,
+        dedup: bool = False
     ) -> None:
         self.name_in_message = name_in_message
         self.source_location = source_location
@@ -48,6 +64,9 @@ class Backup:
         self.old_backup_interval = old_backup_interval
         self.sync_gdrive = sync_gdrive
         self.gdrive_args = gdrive_args
+        self.hard_links = hard_links
+        self.copy_workers = copy_workers
+        self.dedup = dedup
 
 # List of apps, which need a backup with source/destination parameters
 # apps names are only lowercase. Don't forget the app name in backup_dir
@@ -62,7 +81,9 @@ BACKUPS = {
         name_in_message='Obsidian',
         source_location=expanduser('~/Documents/ObsidianVault/'),
         backup_dir='/mnt/kllisre/Backups/Obsidian/',
-        backup_amount=50
+        backup_amount=50,
+        hard_links=True,
+        copy_workers=8
         # sync_gdrive=True,
         # gdrive_args=['ObsidianVault', '--sync-direction', 'mirror', '--ignore', 'path=.obsidian,type=all_files']
     )
@@ -157,6 +178,8 @@ NOP_SHORTCUTS = {
     ('ctrl', 'Mod4', 's'): 'exchange_screens',
     ('ctrl', 'Mod4', 'j'): 'move_to_left',
     ('ctrl', 'Mod4', 'semicolon'): 'move_to_right',
+    # how long probes of new windows take
+    ('ctrl', 'Mod4', 't'): 'probe_stats',
     # win alt p
     ('Mod1', 'Mod4', 'p'): 'paste_clipboard',
 }
@@ -187,6 +210,16 @@ GENMON_OUTPUT_MAPPING = {
     'DP-0': 'genmon-22'
 }
 
+# screens states changed during this time are sent to the
+# sinks at once, in the end of it, in seconds
+STATUS_FRAME = 0.016
+# where screens states go. 'genmon' - files in /tmp for xfce4 genmons,
+# the rest stream states as json lines, like
+# {"output": "DP-0", "mode": "default", "layout": "h", "ws": 5}:
+# 'stdout', 'fifo:/path/to/fifo' and 'socket:/path/to/socket',
+# the socket takes any number of clients
+STATUS_SINKS = ['genmon']
+
 # Compositor can be launched just as a process or as a systemd
 # --user service. If it's launched as a service, put here
 # it's name, like 'picom.service', otherwise left an empty string ''
@@ -211,9 +244,33 @@ TERMINAL_APPS = {
     'xray': 10,
     'snx-rs': 10
 }
+# terminal emulators which can host apps from above. Terminal apps
+# need some time to start after their terminal window appeared, so
+# only new windows of these classes wait for them, in seconds
+TERMINALS = ['^xfce4-terminal$']
+TERMINAL_APP_WAIT = 0.3
+# a new container may be not in the tree yet, when the event about
+# it comes, so wait for it, but not longer than, in seconds
+NEW_CONTAINER_WAIT = 0.5
+# new windows, which open within this time after the first one, are
+# probed and placed together, like windows of a starting game, in seconds
+NEW_WINDOW_BATCH = 0.05
 
 # special ws for all almost daemons. Windows don't get touched there
 WS_SPECIAL = 10
+
+# if i3 isn't up yet when the script starts, like when it's
+# started as a systemd unit, wait for it's socket, in seconds
+I3_SOCKET_WAIT = 10
+
+# blocking side effects of events, like backups or windows accounting,
+# run on a pool of threads, so the event loop is never blocked.
+# The amount of these threads
+JOB_WORKERS = 4
+
+# check that windows accounting indexes agree with the windows after
+# every change. Slow, only for debugging
+DEBUG_ACCOUNTING = False
 # a list of regex patterns to distinguish games. Steam games
 # look like steam_app_12345
 GAMES = [
@@ -0,0 +1,189 @@
+from time import monotonic
+from threading import Lock, Event
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from i3ipc import con
+from .additional_funcs import wait_until
+from .classifier import CLASSIFIER
+from .proc_table import PROCESSES
+from .x_properties import X_PROPERTIES, WindowProperties
+from .config import NEW_CONTAINER_WAIT, TERMINAL_APP_WAIT
+
+
+@dataclass(slots=True)
+class Enrichment:
+    """Facts about a new window, collected by probes
+
+        container: the container from the tree, None if the
+                window disappeared or didn't appear in time
+        properties: X properties of the window
+        term_app: what the probe found about a terminal app in
+                the window, see WindowsAccount._match_term_app
+        term_app_ws: assigned ws of the terminal app running
+                in the window, if it's a terminal with such app.
+                Made of term_app by the accounting
+    """
+    container: con.Con|None = None
+    properties: WindowProperties = field(default_factory=WindowProperties)
+    term_app: tuple[int, int|None]|None = None
+    term_app_ws: int|None = None
+
+
+class WindowEnricher:
+    """Collects facts about new windows for the accounting. The
+    probes don't depend on each other, so they run at the same time,
+    the enrichment takes as long as the slowest probe, not as all of
+    them together. Several windows are enriched at once, every probe
+    goes through all of them, so they share one tree and one processes
+    snapshot. A probe which doesn't make it in it's timeout is ignored,
+    the facts stay unknown. Probes only read, what they found is applied
+    to the accounting by the caller, so a late probe can't change it.
+    How long every probe takes is kept in stats
+    """
+    # probe name -> seconds to wait for it's result
+    PROBE_TIMEOUTS = {
+        'container': NEW_CONTAINER_WAIT + 0.1,
+        'properties': 0.5,
+        'term_app': TERMINAL_APP_WAIT + 0.1
+    }
+
+    def __init__(self, account, max_workers: int=3) -> None:
+        # the accounting, it knows terminal apps and the tree
+        self.account = account
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='probe')
+        self._stats_lock = Lock()
+        # probe name -> runs, total seconds, the longest and the last run
+        self._stats = {}
+
+    def enrich(self, window: con.Con) -> Enrichment:
+        """Runs all probes for a new window and collects their results
+
+        Args:
+            window (con.Con): the container from the window::new event
+
+        Returns:
+            Enrichment: facts about the window
+        """
+        return self.enrich_many([window])[0]
+
+    def enrich_many(self, windows: list[con.Con]) -> list[Enrichment]:
+        """Runs all probes for new windows and collects their results
+
+        Args:
+            windows (list[con.Con]): containers from window::new events
+
+        Returns:
+            list[Enrichment]: facts about the windows, in the same order
+        """
+        started = monotonic()
+        # tells probes which are still waiting nobody needs them anymore
+        done = Event()
+        probes = {
+            'container': self._executor.submit(
+                self._timed, self._probe_containers, windows, started + NEW_CONTAINER_WAIT
+            ),
+            'properties': self._executor.submit(
+                self._timed, self._probe_properties, windows
+            ),
+            'term_app': self._executor.submit(
+                self._timed, self._probe_term_apps, windows, done
+            ),
+        }
+        facts = [ Enrichment() for _ in windows ]
+        timings = {}
+        for name, probe in probes.items():
+            remaining = started + self.PROBE_TIMEOUTS[name] - monotonic()
+            try:
+                values, seconds = probe.result(timeout=max(0, remaining))
+            # the facts stay unknown, the probe finishes on it's own
+            except FutureTimeout:
+                timings[name] = monotonic() - started
+                continue
+            for window_facts, value in zip(facts, values):
+                if value is not None:
+                    setattr(window_facts, name, value)
+            timings[name] = seconds
+        done.set()
+        timings['total'] = monotonic() - started
+        self._record(timings)
+        for window, window_facts in zip(windows, facts):
+            window_facts.term_app_ws = self.account._term_app_ws_of(window.window, window_facts.term_app)
+        return facts
+
+    def _probe_containers(self, windows: list[con.Con], deadline: float) -> list[con.Con|None]:
+        """Finds containers in the tree. The tree is fetched once,
+        those which aren't there yet are waited for till the deadline
+        """
+        return [
+            self.account.tree.wait_for_con(window.id, max(0, deadline - monotonic()))
+            for window in windows
+        ]
+
+    @staticmethod
+    def _probe_properties(windows: list[con.Con]) -> list[WindowProperties]:
+        return [ X_PROPERTIES.get(window.window) for window in windows ]
+
+    def _probe_term_apps(self, windows: list[con.Con], done: Event) -> list[tuple[int, int|None]|None]:
+        """Checks if terminal apps run in the windows. Terminal apps
+        need some time to start after their terminal window appeared,
+        so terminals are checked until their apps show up or nobody
+        waits for them. Other windows are checked once, an app could
+        make it's own window. Keeps it's own index of terminal apps,
+        the one of the accounting belongs to the lane
+        """
+        # the index is built once per processes snapshot
+        snapshot, index = None, None
+
+        def match(window: con.Con) -> tuple[int, int|None]|None:
+            nonlocal snapshot, index
+            processes = PROCESSES.snapshot()
+            if processes is not snapshot:
+                snapshot, index = processes, self.account._index_term_apps(processes)
+            return self.account._match_term_app(window.window, *index)
+
+        found = [ match(window) for window in windows ]
+        waiting = [
+            num for num, window in enumerate(windows)
+            if found[num] is None and CLASSIFIER.classify(window.window_class).terminal
+        ]
+
+        def check() -> bool:
+            if done.is_set():
+                return True
+            # one processes snapshot for all waiting terminals
+            PROCESSES.invalidate()
+            for num in list(waiting):
+                found[num] = match(windows[num])
+                if found[num] is not None:
+                    waiting.remove(num)
+            return not waiting
+
+        if waiting:
+            wait_until(check, TERMINAL_APP_WAIT)
+        return found
+
+    @staticmethod
+    def _timed(func, *args) -> tuple:
+        started = monotonic()
+        result = func(*args)
+        return result, monotonic() - started
+
+    def _record(self, timings: dict[str, float]) -> None:
+        with self._stats_lock:
+            for name, seconds in timings.items():
+                runs, total, longest, _ = self._stats.get(name, (0, 0.0, 0.0, 0.0))
+                self._stats[name] = (runs + 1, total + seconds, max(longest, seconds), seconds)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Timings of probes over all enrichments so far, 'total'
+        is whole enrichments. Shown by the probe_stats shortcut
+
+        Returns:
+            dict[str, dict[str, float]]: probe name -> runs, average,
+                    the longest and the last run, in seconds
+        """
+        with self._stats_lock:
+            return {
+                name: { 'runs': runs, 'average': total / runs, 'longest': longest, 'last': last }
+                for name, (runs, total, longest, last) in self._stats.items()
+            }
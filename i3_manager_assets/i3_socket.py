@@ -0,0 +1,138 @@
+import os
+import stat
+import ctypes
+import select
+import subprocess
+from time import monotonic, sleep
+from .x_properties import X_PROPERTIES
+
+# inotify events, which mean a file appeared in a directory
+IN_CREATE = 0x00000100
+IN_MOVED_TO = 0x00000080
+
+
+def _is_socket(path: str|None) -> bool:
+    if not path:
+        return False
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def socket_candidates():
+    """Where i3 tells about it's socket, the cheapest first:
+    I3SOCK of the session, I3_SOCKET_PATH of the root window, which
+    is where `i3 --get-socketpath` reads it from. X is asked only
+    if the environment didn't help
+
+    Yields:
+        str: paths, not checked
+    """
+    if os.environ.get('I3SOCK'):
+        yield os.environ['I3SOCK']
+    root_path = X_PROPERTIES.root_string('I3_SOCKET_PATH')
+    if root_path:
+        yield root_path
+
+
+class DirWatch:
+    """Wakes up when files appear in directories, by inotify.
+    Without inotify wait() just sleeps the timeout
+    """
+
+    def __init__(self, dirs: list[str]) -> None:
+        self._fd = None
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        # not linux or no libc
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        watched = 0
+        for path in dirs:
+            if os.path.isdir(path):
+                watched += libc.inotify_add_watch(fd, os.fsencode(path), IN_CREATE | IN_MOVED_TO) >= 0
+        if not watched:
+            os.close(fd)
+            return
+        self._fd = fd
+
+    def wait(self, timeout: float) -> None:
+        """Waits for a new file or the timeout, whatever comes first
+
+        Args:
+            timeout (float): seconds
+        """
+        if self._fd is None:
+            sleep(timeout)
+            return
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        # the events themselves don't matter, only that there were some
+        if ready:
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def find_socket_path(timeout: float=10, first_delay: float=0.05, max_delay: float=1) -> str|None:
+    """Finds the i3 ipc socket. If i3 isn't up yet, like when the
+    script is started as a systemd unit, waits for it. Checks are
+    repeated with growing delays, and a socket appearing in the
+    runtime directory wakes the wait up at once
+
+    Args:
+        timeout (float, optional): seconds to wait for i3
+        first_delay (float, optional): the first delay between checks
+        max_delay (float, optional): delays don't grow further
+
+    Returns:
+        str|None: socket path or None if i3 didn't show up in time
+    """
+    deadline = monotonic() + timeout
+    delay = first_delay
+    # i3 puts it's socket to $XDG_RUNTIME_DIR/i3, which it may create
+    runtime = os.environ.get('XDG_RUNTIME_DIR', '')
+    dirs = { runtime, os.path.join(runtime, 'i3') } if runtime else set()
+    while True:
+        # the watch is set before the check, so a socket which
+        # appears right after the check isn't missed. It's set again
+        # every time, a new directory may have appeared meanwhile
+        watch = DirWatch(sorted(dirs))
+        try:
+            candidates = []
+            for path in socket_candidates():
+                if _is_socket(path):
+                    return path
+                candidates.append(path)
+            # neither the environment nor X know the socket, last
+            # resort in case the X server can't be reached
+            if not candidates:
+                try:
+                    path = subprocess.run(
+                        ['i3', '--get-socketpath'],
+                        text=True,
+                        capture_output=True,
+                        check=True
+                    ).stdout.strip()
+                except (subprocess.CalledProcessError, FileNotFoundError):
+                    path = None
+                if _is_socket(path):
+                    return path
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                return None
+            dirs.update(os.path.dirname(path) for path in candidates)
+            watch.wait(min(delay, remaining))
+            delay = min(delay * 2, max_delay)
+        finally:
+            watch.close()
@@ -0,0 +1,129 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, RLock, Timer
+
+
+class JobPool:
+    """A bounded pool of threads for blocking side effects of i3
+    events, like backups or probing processes. Jobs with the same
+    key never run at the same time, they wait in a queue and run
+    in the order they were submitted. Jobs with different keys
+    run in parallel as long as there are free workers
+    """
+
+    def __init__(self, max_workers: int=4) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._lock = Lock()
+        # key -> queue of jobs waiting for the running one of this key.
+        # A key is present only while a job of it is running
+        self._queues = {}
+
+    def submit(self, key, func, *args, on_done=None, coalesce: bool=False) -> Future:
+        """Hands a job to the pool
+
+        Args:
+            key (hashable): jobs with equal keys are run one by one
+            func (callable): the job
+            on_done (callable, optional): called with the job future
+                    when the job is finished, on the worker thread
+            coalesce (bool, optional): if a job of this key is already
+                    waiting, don't queue one more, it would do the
+                    same. The waiting job future is returned instead
+
+        Returns:
+            Future: the job result
+        """
+        future = Future()
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is not None:
+                if coalesce and queue:
+                    return queue[-1][0]
+                queue.append((future, func, args, on_done))
+                return future
+            self._queues[key] = deque()
+        self._executor.submit(self._run, key, future, func, args, on_done)
+        return future
+
+    def _run(self, key, future: Future, func, args: tuple, on_done) -> None:
+        """Runs a job and starts the next one of the same key
+
+        Args:
+            key (hashable): job key
+            future (Future): where to put the result
+            func (callable): the job
+            args (tuple): arguments of the job
+            on_done (callable): result callback
+        """
+        try:
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(func(*args))
+                except BaseException as exc:
+                    future.set_exception(exc)
+                if on_done is not None:
+                    on_done(future)
+        finally:
+            self._run_next(key)
+
+    def _run_next(self, key) -> None:
+        """Starts the next waiting job of a key or frees the key
+
+        Args:
+            key (hashable): job key
+        """
+        # the key stays busy until the queue is empty
+        with self._lock:
+            queue = self._queues[key]
+            if not queue:
+                del self._queues[key]
+                return
+            next_job = queue.popleft()
+        self._executor.submit(self._run, key, *next_job)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Batcher:
+    """Collects items, which come one after another, and hands them
+    over at once. The first item starts a timer, everything which comes
+    until it fires goes into the same batch. A burst of events, like
+    windows of a starting game, is handled as one
+    """
+
+    def __init__(self, delay: float, flush) -> None:
+        """
+        Args:
+            delay (float): seconds to collect items after the first one
+            flush (callable): gets the list of collected items
+        """
+        self.delay = delay
+        self._flush = flush
+        # reentrant, the flush callback may hand it's work to
+        # those who flush the batch first
+        self._lock = RLock()
+        self._items = []
+        self._timer = None
+
+    def add(self, item) -> None:
+        with self._lock:
+            self._items.append(item)
+            if self._timer is None:
+                self._timer = Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Hands over collected items right now. Those who must not
+        overtake the batch, call it before doing their own thing
+        """
+        # the lock is held during the callback, so nothing
+        # gets in between taking the items and handing them
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            items, self._items = self._items, []
+            if items:
+                self._flush(items)
@@ -0,0 +1,99 @@
+import subprocess
+from time import monotonic
+from threading import Lock
+from .session_bus import SessionBusClient, BusUnavailable
+
+
+class Notifier(SessionBusClient):
+    """Shows notifications through the org.freedesktop.Notifications
+    service, without starting notify-send for every message. Every
+    notification gets an id, which can be used to replace or close it.
+    Messages with the same title, which come one after another, are
+    merged into one notification, so a burst of backup results is one
+    popup, not a stack of them. If the bus can't be reached, messages
+    go through notify-send as before
+    """
+    BUS_NAME = 'org.freedesktop.Notifications'
+    OBJECT_PATH = '/org/freedesktop/Notifications'
+    APP_NAME = 'i3_helper'
+    # uses i3 icon for the message
+    ICON = '/usr/share/doc/i3/logo-30.png'
+    URGENCIES = {'low': 0, 'normal': 1, 'critical': 2}
+    # a message which comes within this time after the previous one
+    # with the same title, is added to it, in seconds
+    COALESCE_WINDOW = 2
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._bursts_lock = Lock()
+        # title -> id, lines and time of the last message
+        self._bursts = {}
+
+    def notify(
+        self, title: str, message: str='', timeout: str='10000',
+        urgency: str='normal', replaces: int=0, coalesce: bool=True
+    ) -> int:
+        """Shows a notification or replaces an existing one.
+        urgency=critical makes a message stay until closed
+
+        Args:
+            title (str): notification title
+            message (str, optional): notification text
+            timeout (str, optional): milliseconds to show it
+            urgency (str, optional): low, normal or critical
+            replaces (int, optional): id of a notification to replace
+            coalesce (bool, optional): merge with the previous message
+                    of the same title, if it was recent. Doesn't work
+                    together with replaces
+
+        Returns:
+            int: notification id, 0 if it's unknown
+        """
+        coalesce = coalesce and not replaces
+        lines = [message]
+        with self._bursts_lock:
+            now = monotonic()
+            self._bursts = {
+                key: burst for key, burst in self._bursts.items()
+                if now - burst[2] < self.COALESCE_WINDOW
+            }
+            if coalesce and title in self._bursts:
+                replaces, lines, _ = self._bursts[title]
+                # the same message twice doesn't tell anything new
+                if message not in lines:
+                    lines = lines + [message]
+            try:
+                reply = self.call('Notify', 'susssasa{sv}i', (
+                    self.APP_NAME, replaces, self.ICON, title, '\n'.join(lines), [],
+                    {'urgency': ('y', self.URGENCIES.get(urgency, 1))}, int(timeout)
+                ))
+            except BusUnavailable:
+                self._spawn(title, message, timeout, urgency)
+                return 0
+            # the service refused it, the message still has to be seen
+            if reply is None:
+                self._spawn(title, message, timeout, urgency)
+                return 0
+            notification_id = reply[0]
+            if coalesce:
+                self._bursts[title] = (notification_id, lines, monotonic())
+            return notification_id
+
+    def close_notification(self, notification_id: int) -> None:
+        """Closes a notification by it's id
+
+        Args:
+            notification_id (int): the id, returned by notify
+        """
+        try:
+            self.call('CloseNotification', 'u', (notification_id,))
+        # it's a fallback notification, it can't be closed this way
+        except BusUnavailable:
+            pass
+
+    def _spawn(self, title: str, message: str, timeout: str, urgency: str) -> None:
+        subprocess.Popen(['notify-send', '-i', self.ICON, '-t', timeout, '-u', urgency, title, message])
+
+
+# the only instance, all modules use it
+NOTIFIER = Notifier()
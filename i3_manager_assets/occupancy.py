@@ -0,0 +1,150 @@
+def ws_mask(workspaces) -> int:
+    """Builds a mask of workspaces, bit n stands for ws n.
+    Named workspaces and the scratchpad (num < 1) are skipped
+
+    Args:
+        workspaces (iterable[int]): ws nums
+
+    Returns:
+        int: the mask
+    """
+    mask = 0
+    for ws in workspaces:
+        if ws >= 1:
+            mask |= 1 << ws
+    return mask
+
+
+class Occupancy:
+    """Which workspaces are taken and by what, updated on every
+    window add and remove, so the search of a free ws is a couple
+    of bit operations instead of going through all windows of every
+    ws. Python ints have no size limit, so there is no limit on ws
+    nums either.
+
+    Per ws it keeps the number of non floating windows, the number
+    of non sharing ones among them and the outputs where it's windows
+    are (floating too). Named workspaces and the scratchpad aren't
+    counted, new windows never go there
+    """
+
+    def __init__(self) -> None:
+        # ws -> number of non floating windows
+        self._count = {}
+        # ws -> number of non floating, non sharing windows
+        self._non_sharing = {}
+        # (output, ws) -> number of windows, floating too
+        self._owners = {}
+        # masks, bit n stands for ws n.
+        # k -> ws with at least k non floating windows
+        self._at_least = {}
+        # ws with a non floating, non sharing window
+        self._non_sharing_mask = 0
+        # output -> ws which have windows on this output
+        self._output_masks = {}
+
+    def add(self, ws: int, output: str|None, sharing: bool, floating: bool) -> None:
+        """Counts a window in
+
+        Args:
+            ws (int): where the window is
+            output (str | None): the screen of the ws, if it matters
+            sharing (bool): False if the window doesn't share the ws
+            floating (bool): True if the window floats
+        """
+        self._change(ws, output, sharing, floating, 1)
+
+    def remove(self, ws: int, output: str|None, sharing: bool, floating: bool) -> None:
+        """Counts a window out, arguments have to be the same
+        as they were when the window was added
+        """
+        self._change(ws, output, sharing, floating, -1)
+
+    def _change(self, ws: int, output: str|None, sharing: bool, floating: bool, delta: int) -> None:
+        if ws < 1:
+            return
+        bit = 1 << ws
+        if output is not None:
+            key = (output, ws)
+            owned = self._owners.get(key, 0) + delta
+            if owned:
+                self._owners[key] = owned
+                self._output_masks[output] = self._output_masks.get(output, 0) | bit
+            else:
+                del self._owners[key]
+                self._output_masks[output] &= ~bit
+                if not self._output_masks[output]:
+                    del self._output_masks[output]
+        # floating windows don't take the place
+        if floating:
+            return
+        old = self._count.get(ws, 0)
+        new = old + delta
+        if new:
+            self._count[ws] = new
+        else:
+            del self._count[ws]
+        # a ws with n windows is in masks 1..n, only the top one changes
+        if delta > 0:
+            self._at_least[new] = self._at_least.get(new, 0) | bit
+        else:
+            self._at_least[old] &= ~bit
+            if not self._at_least[old]:
+                del self._at_least[old]
+        if not sharing:
+            non_sharing = self._non_sharing.get(ws, 0) + delta
+            if non_sharing:
+                self._non_sharing[ws] = non_sharing
+                self._non_sharing_mask |= bit
+            else:
+                del self._non_sharing[ws]
+                self._non_sharing_mask &= ~bit
+
+    def count(self, ws: int) -> int:
+        """Number of non floating windows on a ws"""
+        return self._count.get(ws, 0)
+
+    def has_non_sharing(self, ws: int) -> bool:
+        """True if a non floating, non sharing window is on a ws"""
+        return ws in self._non_sharing
+
+    def outputs_of(self, ws: int) -> list[str]:
+        """The screens which have windows on a ws. Normally one"""
+        bit = 1 << ws
+        return [ output for output, mask in self._output_masks.items() if mask & bit ]
+
+    def free_ws(self, output: str, sharing: bool, capacity: int, reserved: int=0) -> int:
+        """Finds the lowest ws where a window can be placed. The ws
+        is either empty or the window shares the screen, nobody there
+        is non sharing and the capacity isn't reached yet. Workspaces
+        with windows on other screens are skipped
+
+        Args:
+            output (str): the screen where the window goes
+            sharing (bool): False if the window doesn't share the ws
+            capacity (int): how many windows the screen takes
+            reserved (int, optional): mask of workspaces which
+                    can't be taken, like assigned to other screens
+
+        Returns:
+            int: ws num
+        """
+        blocked = reserved | 1
+        for other, mask in self._output_masks.items():
+            if other != output:
+                blocked |= mask
+        if sharing:
+            blocked |= self._non_sharing_mask | self._at_least.get(max(capacity, 1), 0)
+        else:
+            blocked |= self._at_least.get(1, 0)
+        # the lowest zero bit of blocked, ~ of a python int has
+        # infinite leading ones, so there is always one
+        free = ~blocked
+        return (free & -free).bit_length() - 1
+
+    def snapshot(self) -> tuple:
+        """All the state, to compare two occupancies"""
+        return (
+            self._count, self._non_sharing, self._owners,
+            self._at_least, self._non_sharing_mask, self._output_masks
+        )
@@ -0,0 +1,241 @@
+import os
+import re
+import select
+import signal
+from time import monotonic, sleep
+from threading import Lock
+from functools import lru_cache
+from dataclasses import dataclass
+
+
+@dataclass(slots=True, frozen=True)
+class Process:
+    """One process from /proc
+
+        pid: process id
+        ppid: parent process id
+        comm: process name, the same pgrep matches, up to 15 chars
+        state: R, S, Z and so on, Z is a zombie, which already exited
+        uid: the owner
+        start_time: start time in clock ticks since boot, together
+                with pid it identifies a process, pids get reused
+    """
+    pid: int
+    ppid: int
+    comm: str
+    state: str
+    uid: int
+    start_time: int
+
+
+@lru_cache(maxsize=64)
+def _compile(pattern: str) -> re.Pattern:
+    return re.compile(pattern)
+
+
+def read_process(pid: int) -> Process|None:
+    """Reads one process from /proc
+
+    Args:
+        pid (int): process id
+
+    Returns:
+        Process|None: the process or None if it's gone
+    """
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            stat = f.read().decode(errors='replace')
+        uid = os.stat(f'/proc/{pid}').st_uid
+    except (FileNotFoundError, ProcessLookupError):
+        return None
+    # the name is in parentheses and can have any chars, even
+    # parentheses and spaces, so it ends with the last ')'
+    comm_start = stat.index('(') + 1
+    comm_end = stat.rindex(')')
+    # fields after the name start from the 3rd one, state
+    fields = stat[comm_end + 2:].split()
+    return Process(
+        pid=pid,
+        ppid=int(fields[1]),
+        comm=stat[comm_start:comm_end],
+        state=fields[0],
+        uid=uid,
+        start_time=int(fields[19])
+    )
+
+
+class ProcessTable:
+    """A snapshot of all processes, read from /proc without starting
+    pgrep. One snapshot answers all lookups for MAX_AGE seconds, so
+    lookups of one event, like a terminal app check for every window,
+    read /proc once
+    """
+    # seconds a snapshot is used for
+    MAX_AGE = 0.05
+    # seconds a process has to exit after SIGTERM, before SIGKILL
+    KILL_TIMEOUT = 3
+
+    def __init__(self) -> None:
+        self._lock = Lock()
+        # pid -> process
+        self._processes = {}
+        self._taken_at = None
+
+    def invalidate(self) -> None:
+        """Makes the next lookup read /proc again. For those
+        who wait for a process to appear
+        """
+        with self._lock:
+            self._taken_at = None
+
+    def snapshot(self) -> dict[int, Process]:
+        """Returns all processes, reads /proc if the
+        current snapshot is too old
+
+        Returns:
+            dict[int, Process]: pid -> process
+        """
+        with self._lock:
+            if self._taken_at is None or monotonic() - self._taken_at > self.MAX_AGE:
+                processes = {}
+                for entry in os.scandir('/proc'):
+                    if not entry.name.isdigit():
+                        continue
+                    process = read_process(int(entry.name))
+                    if process is not None:
+                        processes[process.pid] = process
+                self._processes = processes
+                self._taken_at = monotonic()
+            return self._processes
+
+    def get(self, pid: int) -> Process|None:
+        return self.snapshot().get(pid)
+
+    def find(self, pattern: str, uid: int|None=None) -> list[Process]:
+        """Searches processes like pgrep does, the pattern
+        is searched in the process name
+
+        Args:
+            pattern (str): regex pattern
+            uid (int | None, optional): the owner, the current
+                    user if not given
+
+        Returns:
+            list[Process]: found processes, oldest first
+        """
+        if uid is None:
+            uid = os.getuid()
+        regex = _compile(pattern)
+        return sorted((
+            process for process in self.snapshot().values()
+            if process.uid == uid and regex.search(process.comm)
+        ), key=lambda process: process.start_time)
+
+    def kill(self, pattern: str, uid: int|None=None) -> None:
+        """Gently kills processes, found like pgrep does. Those
+        which are still alive after KILL_TIMEOUT are terminated.
+        Exits are awaited on pidfds, so there is no polling and
+        a reused pid never gets a signal
+
+        Args:
+            pattern (str): regex pattern
+            uid (int | None, optional): the owner, the current
+                    user if not given
+        """
+        self.invalidate()
+        opened = []
+        try:
+            for process in self.find(pattern, uid):
+                handle = self._open(process)
+                if handle is not None:
+                    opened.append(handle)
+            signaled = [ handle for handle in opened if self._signal(handle, signal.SIGTERM) ]
+            for handle in self._wait(signaled, self.KILL_TIMEOUT):
+                self._signal(handle, signal.SIGKILL)
+        finally:
+            for fd, _ in opened:
+                if fd is not None:
+                    os.close(fd)
+            self.invalidate()
+
+    @staticmethod
+    def _open(process: Process) -> tuple[int|None, Process]|None:
+        """Opens a pidfd of a process. Without pidfd support the
+        process is tracked by pid and start time
+
+        Returns:
+            tuple[int|None, Process]|None: pidfd and the process,
+                    None if the process is gone
+        """
+        try:
+            fd = os.pidfd_open(process.pid)
+        except ProcessLookupError:
+            return None
+        except (AttributeError, OSError):
+            return None, process
+        # the pid could be reused between the snapshot and the pidfd
+        current = read_process(process.pid)
+        if current is None or current.start_time != process.start_time:
+            os.close(fd)
+            return None
+        return fd, process
+
+    @staticmethod
+    def _signal(handle: tuple[int|None, Process], sig: int) -> bool:
+        """Sends a signal, returns False if the process is gone"""
+        fd, process = handle
+        try:
+            if fd is not None:
+                signal.pidfd_send_signal(fd, sig)
+            else:
+                current = read_process(process.pid)
+                if current is None or current.start_time != process.start_time:
+                    return False
+                os.kill(process.pid, sig)
+            return True
+        except ProcessLookupError:
+            return False
+
+    @staticmethod
+    def _wait(handles: list[tuple[int|None, Process]], timeout: float) -> list[tuple[int|None, Process]]:
+        """Waits for processes to exit
+
+        Returns:
+            list[tuple[int|None, Process]]: processes still alive
+        """
+        deadline = monotonic() + timeout
+        # a pidfd gets readable when the process exits
+        alive = list(handles)
+        poller = select.poll()
+        for fd, _ in alive:
+            if fd is not None:
+                poller.register(fd, select.POLLIN)
+        while alive:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            if all(fd is not None for fd, _ in alive):
+                exited = { fd for fd, _ in poller.poll(remaining * 1000) }
+            # without pidfds check the pids from time to time
+            else:
+                sleep(min(0.05, remaining))
+                exited = { fd for fd, _ in poller.poll(0) }
+            still_alive = []
+            for fd, process in alive:
+                if fd is not None:
+                    gone = fd in exited
+                else:
+                    current = read_process(process.pid)
+                    gone = (current is None or current.state == 'Z' or
+                            current.start_time != process.start_time)
+                if gone:
+                    if fd is not None:
+                        poller.unregister(fd)
+                else:
+                    still_alive.append((fd, process))
+            alive = still_alive
+        return alive
+
+
+# the only instance, all modules use it
+PROCESSES = ProcessTable()
@@ -0,0 +1,106 @@
+from time import monotonic
+from threading import Lock
+
+# jeepney is optional, without it clients use their fallbacks
+try:
+    from jeepney import DBusAddress, MessageType, new_method_call
+    from jeepney.io.blocking import open_dbus_connection
+except ImportError:
+    open_dbus_connection = None
+
+
+class BusUnavailable(Exception):
+    """There is no working session bus connection"""
+
+
+class SessionBusClient:
+    """Calls methods of one D-Bus service over a session bus
+    connection, which is opened once and kept. If the bus can't
+    be reached, BusUnavailable is raised, so a client can do the
+    same thing some other way. The connection is tried again
+    not earlier than RECONNECT_DELAY
+    """
+    BUS_NAME = ''
+    OBJECT_PATH = ''
+    # the interface has the same name as the service if not set
+    INTERFACE = None
+    # seconds to wait for a reply
+    REPLY_TIMEOUT = 1
+    # seconds between attempts to connect to the bus
+    RECONNECT_DELAY = 10
+
+    def __init__(self) -> None:
+        # calls can come from the event loop and from the job pool
+        self._lock = Lock()
+        self._connection = None
+        # when the next attempt to connect is allowed
+        self._retry_at = 0
+        self._address = None
+        if open_dbus_connection is not None:
+            self._address = DBusAddress(
+                self.OBJECT_PATH, bus_name=self.BUS_NAME,
+                interface=self.INTERFACE or self.BUS_NAME
+            )
+
+    def call(self, method: str, signature: str, body: tuple) -> tuple|None:
+        """Calls a method and waits for the reply
+
+        Args:
+            method (str): method name
+            signature (str): D-Bus signature of the arguments
+            body (tuple): arguments
+
+        Raises:
+            BusUnavailable: no connection to the bus
+
+        Returns:
+            tuple|None: the reply or None if the service replied
+                    with an error, like when it isn't running
+        """
+        with self._lock:
+            connection = self._connect()
+            if connection is None:
+                raise BusUnavailable(self.BUS_NAME)
+            message = new_method_call(self._address, method, signature, body)
+            try:
+                reply = connection.send_and_get_reply(message, timeout=self.REPLY_TIMEOUT)
+            # the connection is broken or the service hangs
+            except (OSError, TimeoutError):
+                self._disconnect()
+                raise BusUnavailable(self.BUS_NAME)
+            # the blocking connection doesn't raise on errors, it
+            # returns the error reply, with the error text as the body
+            if reply.header.message_type == MessageType.error:
+                return None
+            return reply.body
+
+    def _connect(self):
+        """Returns the connection, opens it if it's time to
+
+        Returns:
+            DBusConnection|None: connection if the bus is reachable
+        """
+        if self._connection is not None or self._address is None:
+            return self._connection
+        if monotonic() < self._retry_at:
+            return None
+        try:
+            self._connection = open_dbus_connection(bus='SESSION')
+        # no bus address in the environment, the bus is down
+        # or it didn't let us in
+        except (OSError, KeyError, ValueError):
+            self._retry_at = monotonic() + self.RECONNECT_DELAY
+        return self._connection
+
+    def _disconnect(self) -> None:
+        try:
+            self._connection.close()
+        except OSError:
+            pass
+        self._connection = None
+        self._retry_at = monotonic() + self.RECONNECT_DELAY
+
+    def close(self) -> None:
+        with self._lock:
+            if self._connection is not None:
+                self._disconnect()
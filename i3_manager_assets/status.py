@@ -0,0 +1,350 @@
+import os
+import sys
+import json
+import socket
+import errno
+from stat import S_ISFIFO
+from threading import Lock, Thread, Timer
+from .panel_bus import PanelBus
+from .config import GENMON_OUTPUT_MAPPING, COLORS, STATUS_FRAME
+
+
+# contains an information about a screen state for quick output
+class OneScreen:
+    """This class is responsible for tracking the state
+    which should be shown on a screen. That "default|h|5".
+    One screen - one instance
+    """
+
+    def __init__(self, name: str, active_ws: str|None=None, split_type: str|None=None) -> None:
+        self.output = name
+        # turns screen output name into a file name which starts with i3
+        self.name = f'/tmp/i3_{name}'
+        # currently active workspace
+        self.active_ws = active_ws
+        # h or v for the output
+        self._split_type = split_type
+        # splith or splitv, the inner i3ipc value. Required, so we can
+        # check, if any changes happened and don't rewrite a file
+        self.inner_split_type = None
+        # the binding mode is global, but every screen shows it
+        self.mode = 'default'
+        # take the proper genmon name from settings
+        self.genmon = GENMON_OUTPUT_MAPPING[name]
+
+    @property
+    def split_type(self) -> str | None:
+        return self._split_type
+
+    @split_type.setter
+    def split_type(self, value: str) -> None:
+        """Basically shortens the inner identifiers
+
+        Args:
+            value (str): the value, used by i3
+        """
+        match value:
+            case 'splitv':
+                self._split_type = 'v'
+            case 'splith':
+                self._split_type = 'h'
+            case 'tabbed':
+                self._split_type = 't'
+            case 'stacked':
+                self._split_type = 's'
+        self.inner_split_type = value
+
+    def render(self) -> str:
+        """Forms a colorized string for the genmon
+
+        Returns:
+            str: genmon markup
+        """
+        color = COLORS.get(self.mode, '#E34234')
+        return f'<txt><span foreground="{color}"> {self.mode}</span> ⬩ {self.split_type} ⬩ {self.active_ws} </txt>'
+
+    def state(self) -> dict:
+        """The state for stream consumers
+
+        Returns:
+            dict: output, mode, layout and ws
+        """
+        return {
+            'output': self.output,
+            'mode': self.mode,
+            'layout': self.split_type,
+            'ws': self.active_ws
+        }
+
+
+# ======================= sinks =======================
+# Where screens states go. A sink gets every changed state once,
+# in the end of a frame. They are called one by one, so they must
+# not block, a slow consumer should lose updates, not hold others
+
+class GenmonSink:
+    """Files for xfce4 genmons, refreshed through the panel"""
+
+    def __init__(self, panel: PanelBus) -> None:
+        self.panel = panel
+
+    def publish(self, screen: OneScreen) -> None:
+        self._write(screen.name, screen.render())
+        # refresh the genmon
+        self.panel.plugin_event(screen.genmon, 'refresh')
+
+    @staticmethod
+    def _write(name: str, markup: str) -> None:
+        """Writes a file through a temporary one, which replaces
+        the original at once, so genmon never reads a half
+        written file
+
+        Args:
+            name (str): file name
+            markup (str): content
+        """
+        temp_name = f'{name}.tmp'
+        with open(temp_name, 'w') as f:
+            f.write(markup)
+        os.replace(temp_name, name)
+
+    def close(self) -> None:
+        self.panel.close()
+
+
+def json_line(screen: OneScreen) -> bytes:
+    """A state as one line of json, the format of stream sinks"""
+    return (json.dumps(screen.state(), ensure_ascii=False) + '\n').encode()
+
+
+class StdoutSink:
+    """Json lines to the standard output, for bars which run the
+    script as their input command. The output doesn't block, if the
+    bar doesn't read, lines are lost. A line written in part is
+    finished before the next one
+    """
+
+    def __init__(self) -> None:
+        self._fd = sys.stdout.fileno()
+        os.set_blocking(self._fd, False)
+        # the rest of a line, which didn't fit
+        self._pending = b''
+
+    def publish(self, screen: OneScreen) -> None:
+        try:
+            if self._pending:
+                self._pending = self._pending[os.write(self._fd, self._pending):]
+                # still no room, the new line is lost
+                if self._pending:
+                    return
+            line = json_line(screen)
+            self._pending = line[os.write(self._fd, line):]
+        # the consumer is slow, the line is lost
+        except BlockingIOError:
+            pass
+        # the consumer is gone, nothing to do about it
+        except (BrokenPipeError, ValueError):
+            self._pending = b''
+
+    def close(self) -> None:
+        pass
+
+
+class FifoSink:
+    """Json lines to a named pipe. The pipe is created if it doesn't
+    exist. Nothing is written while nobody reads it, a reader gets
+    states starting from the next change
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        try:
+            if not S_ISFIFO(os.stat(path).st_mode):
+                raise FileExistsError(errno.EEXIST, 'not a fifo', path)
+        except FileNotFoundError:
+            os.mkfifo(path)
+        self._fd = None
+
+    def publish(self, screen: OneScreen) -> None:
+        if self._fd is None:
+            try:
+                self._fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+            # no reader
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    return
+                raise
+        try:
+            os.write(self._fd, json_line(screen))
+        # the reader is slow, the pipe is full. The line is lost
+        except BlockingIOError:
+            pass
+        # the reader has gone, wait for another one
+        except BrokenPipeError:
+            self.close()
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SocketSink:
+    """Json lines to every client of a unix socket. Any number of
+    clients can connect, each one gets the current states of all
+    screens at once and then every change. Clients which don't
+    read fast enough are disconnected
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # a socket file left by a previous run
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(path)
+        self._server.listen()
+        # clients are added by the accepting thread
+        self._lock = Lock()
+        self._clients = []
+        # output -> the last line, for new clients
+        self._last = {}
+        Thread(target=self._accept, name='status-socket', daemon=True).start()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                client, _ = self._server.accept()
+            # the sink is closed
+            except OSError:
+                return
+            client.setblocking(False)
+            with self._lock:
+                if all(self._send(client, line) for line in self._last.values()):
+                    self._clients.append(client)
+
+    @staticmethod
+    def _send(client: socket.socket, line: bytes) -> bool:
+        """Sends a line without waiting, closes the client
+        if the line doesn't fit into it's buffer
+
+        Returns:
+            bool: False if the client was closed
+        """
+        try:
+            if client.send(line) == len(line):
+                return True
+        except OSError:
+            pass
+        client.close()
+        return False
+
+    def publish(self, screen: OneScreen) -> None:
+        line = json_line(screen)
+        with self._lock:
+            self._last[screen.output] = line
+            self._clients = [ client for client in self._clients if self._send(client, line) ]
+
+    def close(self) -> None:
+        self._server.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def make_sinks(specs: list[str]) -> list:
+    """Creates sinks from their config descriptions
+
+    Args:
+        specs (list[str]): like ['genmon', 'socket:/tmp/i3_status.sock']
+
+    Returns:
+        list: sinks
+    """
+    sinks = []
+    for spec in specs:
+        kind, _, path = spec.partition(':')
+        match kind:
+            case 'genmon':
+                sinks.append(GenmonSink(PanelBus()))
+            case 'stdout':
+                sinks.append(StdoutSink())
+            case 'fifo':
+                sinks.append(FifoSink(path))
+            case 'socket':
+                sinks.append(SocketSink(path))
+            case _:
+                raise ValueError(f'Unknown status sink {spec}')
+    return sinks
+
+
+class StatusRenderer:
+    """Sends screens states to the sinks. Handlers only mark
+    screens as changed, all changes of one frame are sent at
+    once, when the frame ends. So a keystroke which changes the
+    mode, the layout and the ws makes one update per screen, not
+    three. A state which is the same as the last sent one isn't
+    sent at all
+    """
+
+    def __init__(self, sinks: list, frame: float=STATUS_FRAME) -> None:
+        self.sinks = sinks
+        # seconds to collect changes
+        self.frame = frame
+        # marks come from the event loop and from the job pool
+        self._lock = Lock()
+        # only one flush sends states at a time
+        self._flush_lock = Lock()
+        # screens changed during the current frame
+        self._dirty = set()
+        # the frame timer, set if a flush is planned
+        self._timer = None
+        # output -> the last sent genmon markup
+        self._sent = {}
+
+    def mark(self, *screens: OneScreen) -> None:
+        """Marks screens as changed, they will be sent
+        in the end of the current frame
+
+        Args:
+            screens (OneScreen): changed screens
+        """
+        with self._lock:
+            self._dirty.update(screens)
+            if self._timer is None:
+                self._timer = Timer(self.frame, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self) -> None:
+        """Sends all changed screens to the sinks. Called by the
+        frame timer, but can be called directly to send without
+        waiting
+        """
+        with self._flush_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            for screen in dirty:
+                # the markup has everything the state has
+                markup = screen.render()
+                if self._sent.get(screen.output) == markup:
+                    continue
+                self._sent[screen.output] = markup
+                for sink in self.sinks:
+                    sink.publish(screen)
+
+    def close(self) -> None:
+        """Sends what's left and closes the sinks"""
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,251 @@
+from time import monotonic
+from threading import RLock, Condition
+from i3ipc import Connection, Event, con
+
+
+class TreeMirror:
+    """Keeps a local copy of the i3 tree, so handlers don't have
+    to request the whole tree on every event. The copy is patched
+    by cheap events (focus, title, close) and is fetched again only
+    when some structural event made it stale.
+
+    Staleness is tracked by a generation counter. Any structural
+    event or an explicit invalidate() increases the generation,
+    the tree remembers the generation it was fetched at. If they
+    differ, the next read fetches the tree once.
+    """
+    # binding commands which never change the tree structure,
+    # so the mirror can skip the refetch after them
+    HARMLESS_COMMANDS = ('nop', 'mode', 'exec', 'focus')
+
+    def __init__(self, i3: Connection) -> None:
+        self.i3 = i3
+        # events come from the i3 main loop, reads can come from
+        # timers or worker threads
+        self._lock = RLock()
+        # wakes up those who wait for some container
+        self._changed = Condition(self._lock)
+        self._tree = None
+        # container id -> container of the current tree
+        self._index = {}
+        self._focused_id = None
+        # the generation the mirror should be at and the
+        # generation the current tree was fetched at
+        self.generation = 0
+        self._tree_generation = -1
+
+    # ======================= state ==========================
+    @property
+    def stale(self) -> bool:
+        return self._tree_generation != self.generation
+
+    def invalidate(self) -> None:
+        """Marks the tree as stale. Has to be called after own
+        commands which change the tree, because events about
+        these changes come later, when the handler is done
+        """
+        with self._lock:
+            self.generation += 1
+            self._changed.notify_all()
+
+    def refresh(self) -> con.Con:
+        """Fetches the whole tree and rebuilds the index
+
+        Returns:
+            con.Con: the root container
+        """
+        with self._lock:
+            tree = self.i3.get_tree()
+            self._index = { tree.id: tree }
+            focused_id = None
+            for node in tree.descendants():
+                self._index[node.id] = node
+                if node.focused:
+                    focused_id = node.id
+            self._tree = tree
+            self._focused_id = focused_id
+            self._tree_generation = self.generation
+            return tree
+
+    def get_tree(self) -> con.Con:
+        """Returns the root container, fetches the tree
+        only if the mirror is stale
+        """
+        with self._lock:
+            if self._tree is None or self.stale:
+                return self.refresh()
+            return self._tree
+
+    # ======================= lookups ========================
+    def find_by_id(self, con_id: int) -> con.Con|None:
+        """Dictionary replacement of con.Con.find_by_id
+
+        Args:
+            con_id (int): container id
+
+        Returns:
+            con.Con|None: container if it's in the tree
+        """
+        with self._lock:
+            self.get_tree()
+            return self._index.get(con_id)
+
+    def find_focused(self) -> con.Con|None:
+        """Returns the focused container, which is tracked
+        by focus events, without traversing the tree
+        """
+        with self._lock:
+            self.get_tree()
+            focused = self._index.get(self._focused_id)
+            # the focused container was closed and the new focus
+            # didn't come with an event, so we have to ask i3
+            if focused is None:
+                focused = self.refresh().find_focused()
+            return focused
+
+    def wait_for_con(self, con_id: int, timeout: float) -> con.Con|None:
+        """Waits for a container to appear in the tree. Returns at
+        once if it's already there, which is the usual case. Otherwise
+        wakes up on every tree change event and checks again. If the
+        container didn't come in time, the tree is fetched once more,
+        it could change without an event
+
+        Args:
+            con_id (int): container id
+            timeout (float): seconds to wait at most
+
+        Returns:
+            con.Con|None: container or None if it didn't appear in time
+        """
+        deadline = monotonic() + timeout
+        with self._lock:
+            while True:
+                # if the tree is fetched now, it's fresh already
+                fetched = self._tree is None or self.stale
+                node = self.find_by_id(con_id)
+                if node is not None:
+                    return node
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            if fetched:
+                return None
+            self.refresh()
+            return self._index.get(con_id)
+
+    def workspaces(self) -> list[con.Con]:
+        with self._lock:
+            return self.get_tree().workspaces()
+
+    def scratchpad(self) -> con.Con:
+        with self._lock:
+            return self.get_tree().scratchpad()
+
+    # ======================= events =========================
+    def subscribe(self, i3: Connection|None = None) -> None:
+        """Subscribes the mirror to the events. Has to be called
+        before other handlers are subscribed, so they see an
+        updated mirror. Connection may differ from the one used
+        for requests, for example an asyncio one
+
+        Args:
+            i3 (Connection | None, optional): connection to
+                    listen events on
+        """
+        i3 = i3 or self.i3
+        i3.on(Event.WINDOW, self.on_window)
+        i3.on(Event.WORKSPACE, self.on_workspace)
+        i3.on(Event.OUTPUT, self.on_output)
+        i3.on(Event.BINDING, self.on_binding)
+
+    def on_window(self, i3, e) -> None:
+        with self._lock:
+            # nothing to patch, the next read will fetch the tree anyway
+            if self._tree is None or self.stale:
+                return
+            node = self._index.get(e.container.id)
+            match e.change:
+                case 'focus':
+                    if node is None:
+                        self.invalidate()
+                        return
+                    self._set_focused(node.id)
+                case 'title':
+                    if node is not None:
+                        node.name = e.container.name
+                        node.ipc_data['name'] = e.container.name
+                case 'close':
+                    if node is not None:
+                        self._detach(node)
+                case 'urgent' | 'mark':
+                    return
+                # new, move, floating, fullscreen_mode
+                case _:
+                    self.invalidate()
+
+    def on_workspace(self, i3, e) -> None:
+        with self._lock:
+            if self._tree is None or self.stale:
+                return
+            if e.change != 'focus' or e.current is None:
+                self.invalidate()
+                return
+            # the event has fresh data about the workspace subtree,
+            # follow it's focus stack to the focused container
+            focused = e.current
+            while focused.ipc_data.get('focus'):
+                child_id = focused.ipc_data['focus'][0]
+                child = next((
+                    node for node in focused.nodes + focused.floating_nodes
+                    if node.id == child_id
+                ), None)
+                if child is None:
+                    break
+                focused = child
+            if focused.id not in self._index:
+                self.invalidate()
+                return
+            self._set_focused(focused.id)
+
+    def on_output(self, i3, e) -> None:
+        self.invalidate()
+
+    def on_binding(self, i3, e) -> None:
+        # any command in a chain can change the layout
+        for command in e.binding.command.split(';'):
+            if not command.strip().startswith(self.HARMLESS_COMMANDS):
+                self.invalidate()
+                return
+
+    def _set_focused(self, con_id: int) -> None:
+        """Moves the focused flag to a new container
+
+        Args:
+            con_id (int): the newly focused container id
+        """
+        old = self._index.get(self._focused_id)
+        if old is not None:
+            old.focused = False
+        self._index[con_id].focused = True
+        self._focused_id = con_id
+
+    def _detach(self, node: con.Con) -> None:
+        """Removes a closed container and it's children from
+        the tree and the index
+
+        Args:
+            node (con.Con): closed container
+        """
+        parent = node.parent
+        if parent is not None:
+            if node in parent.nodes:
+                parent.nodes.remove(node)
+            elif node in parent.floating_nodes:
+                parent.floating_nodes.remove(node)
+        for child in [node, *node.descendants()]:
+            self._index.pop(child.id, None)
+        # i3 silently closes split containers which got empty
+        if (parent is not None and parent.type == 'con' and
+            not parent.nodes and not parent.floating_nodes):
+            self._detach(parent)
@@ -1,29 +1,47 @@
+import asyncio
+from sys import intern
 from time import sleep
 from i3ipc import Connection, con
-from dataclasses import dataclass
-from re import fullmatch, IGNORECASE
+from dataclasses import dataclass, replace
 
 from i3_manager_assets.config import (
-    OUTPUTS, DEFAULT_ASSIGNMENT, NON_BANISHING_APPS,
-    LEFT_RIGHT, TERMINAL_APPS, WS_SPECIAL
+    OUTPUTS, LEFT_RIGHT, TERMINAL_APPS, WS_SPECIAL,
+    NEW_CONTAINER_WAIT, DEBUG_ACCOUNTING
 )
 from .additional_funcs import (
         pid_searcher, find_window_by_pid, get_client_pid_by_id,
         CompositorManager, it_is_a_game
     )
+from .tree_mirror import TreeMirror
+from .classifier import CLASSIFIER
+from .occupancy import Occupancy, ws_mask
+from .proc_table import PROCESSES
+from .x_properties import X_PROPERTIES, WindowProperties
+from .enrichment import WindowEnricher
+from .job_pool import JobPool
 
 
 class WindowsAccount:
 # A class to store information about the majority of applications (their windows)
 # Stores configured apps for the option to banish such windows to other workspaces
 # or put applications with default assignment to workspaces to make "go default" work
-    
-    @dataclass
+    # the key of the job pool lane where accounting runs when it's
+    # moved off the event loop. Changes are applied one by one
+    JOB_KEY = 'windows'
+    # how many planned commands are sent to i3 in one request
+    PLAN_BATCH = 64
+
+    # i3 floating states of a container which mean it floats
+    FLOATING_ON = ('auto_on', 'user_on')
+
+    @dataclass(slots=True)
     class App:
         """A class to store information about one window.
         it duplicates the info from default assignment,
         but shouldn't have too much of impact to the
-        performance
+        performance. Slotted, class and output strings are
+        interned, so thousands of windows take little memory
+        and comparisons are cheap
 
             w_con_id: an id of the exact window container
             w_win_id: an id of window in the system, not in wm
@@ -36,28 +54,185 @@ class WindowsAccount:
             w_current_output: the output where the windows is now
             w_parent_id: if a window was spawned by another window,
                     the id of this another window be recorded here
-            w_floating: this state is taken into account when
-                    searching new ws for a window
+            w_floating: True if the window floats, this state is taken
+                    into account when searching new ws for a window
             w_terminal_app: special case when apps, running in a
                     terminal won't be treated as a terminal, but
                     as standalone apps
+            w_pid: the process which owns the window, from _NET_WM_PID,
+                    None if the window doesn't tell
+
+        Ws, output and floating state of a tracked window are
+        indexed, change them only through _relocate and
+        _set_floating
         """
         w_con_id: int
         w_win_id: int
         w_cls: str
         w_current_ws: int
-        w_floating: str
+        w_floating: bool
         w_current_output: str
         w_default_output: str|None = None
         w_default_ws: int = 0
         w_sharing: bool = True
         w_parent_id: int|None = None
         w_terminal_app: bool = False
+        w_pid: int|None = None
 
 
-    def __init__(self, i3: Connection) -> None:
-        self.windows = []
+    def __init__(self, i3: Connection, tree: TreeMirror, enricher: WindowEnricher|None=None) -> None:
+        """
+        Args:
+            i3 (Connection): blocking connection to i3
+            tree (TreeMirror): local copy of the i3 tree
+            enricher (WindowEnricher | None, optional): the enricher
+                    to share. Copies of the accounting, which only plan
+                    or check, take the one of the real accounting, so
+                    they don't start probe threads of their own
+        """
         self.i3 = i3
+        # local copy of the i3 tree, fed by events
+        self.tree = tree
+        # all tracked windows by container id, in the order they were
+        # tracked, and indexes over them. Inner dicts are keyed by
+        # container id too, so they keep the order and removal is O(1)
+        self._by_con_id = {}
+        self._by_win_id = {}
+        self._by_ws = {}
+        self._by_output = {}
+        # lowercase class -> windows
+        self._by_class = {}
+        # pid of the owning process -> windows
+        self._by_pid = {}
+        # window id -> assigned ws of the terminal app running in it,
+        # ancestors of terminal apps which don't know their window
+        # and the processes snapshot both are built from
+        self._term_app_windows = {}
+        self._term_app_ancestors = []
+        self._term_app_snapshot = None
+        # what takes which ws, for a quick search of a free one
+        self._occupancy = Occupancy()
+        # collects facts about new windows
+        self.enricher = enricher or WindowEnricher(self)
+
+
+    @property
+    def windows(self) -> list[App]:
+        """All tracked windows, in the order they were tracked"""
+        return list(self._by_con_id.values())
+
+
+    def _track(self, app: App) -> None:
+        """Adds a window to the accounting and the indexes
+
+        Args:
+            app (App): window
+        """
+        self._by_con_id[app.w_con_id] = app
+        self._by_win_id[app.w_win_id] = app
+        self._by_class.setdefault(app.w_cls.lower(), {})[app.w_con_id] = app
+        if app.w_pid is not None:
+            self._by_pid.setdefault(app.w_pid, {})[app.w_con_id] = app
+        self._place(app)
+
+
+    def _untrack(self, app: App) -> None:
+        """Removes a window from the accounting and the indexes
+
+        Args:
+            app (App): window
+        """
+        self._unplace(app)
+        del self._by_con_id[app.w_con_id]
+        if self._by_win_id.get(app.w_win_id) is app:
+            del self._by_win_id[app.w_win_id]
+        self._drop_from(self._by_class, app.w_cls.lower(), app)
+        if app.w_pid is not None:
+            self._drop_from(self._by_pid, app.w_pid, app)
+
+
+    def _place(self, app: App) -> None:
+        """Adds a window to the indexes which depend on where
+        it is and whether it floats
+
+        Args:
+            app (App): window
+        """
+        self._by_ws.setdefault(app.w_current_ws, {})[app.w_con_id] = app
+        self._by_output.setdefault(app.w_current_output, {})[app.w_con_id] = app
+        self._occupancy.add(app.w_current_ws, app.w_current_output, app.w_sharing, app.w_floating)
+
+
+    def _unplace(self, app: App) -> None:
+        """The opposite of _place
+
+        Args:
+            app (App): window
+        """
+        self._drop_from(self._by_ws, app.w_current_ws, app)
+        self._drop_from(self._by_output, app.w_current_output, app)
+        self._occupancy.remove(app.w_current_ws, app.w_current_output, app.w_sharing, app.w_floating)
+
+
+    @staticmethod
+    def _drop_from(index: dict, key, app: App) -> None:
+        del index[key][app.w_con_id]
+        # don't keep empty buckets, ws are checked for emptiness
+        if not index[key]:
+            del index[key]
+
+
+    def _relocate(self, app: App, ws: int, output: str) -> None:
+        """Changes ws and output of a tracked window
+
+        Args:
+            app (App): window
+            ws (int): new ws
+            output (str): new output
+        """
+        if app.w_current_ws == ws and app.w_current_output == output:
+            return
+        self._unplace(app)
+        app.w_current_ws = ws
+        app.w_current_output = output
+        self._place(app)
+
+
+    def _set_floating(self, app: App, floating: bool) -> None:
+        """Changes floating state of a tracked window
+
+        Args:
+            app (App): window
+            floating (bool): new state
+        """
+        if app.w_floating == floating:
+            return
+        self._unplace(app)
+        app.w_floating = floating
+        self._place(app)
+
+
+    def _check_indexes(self) -> None:
+        """Debug check that indexes agree with windows. Rebuilds
+        them from scratch and compares, raises AssertionError
+        """
+        expected = WindowsAccount(self.i3, self.tree, self.enricher)
+        for app in self._by_con_id.values():
+            expected._track(app)
+        assert self._by_win_id == expected._by_win_id, 'accounting index _by_win_id is broken'
+        # order inside buckets may differ after relocations
+        for name in ('_by_ws', '_by_output', '_by_class', '_by_pid'):
+            actual = { key: set(wins) for key, wins in getattr(self, name).items() }
+            wanted = { key: set(wins) for key, wins in getattr(expected, name).items() }
+            assert actual == wanted, f'accounting index {name} is broken'
+        assert (self._occupancy.snapshot() == expected._occupancy.snapshot()), \
+            'workspaces occupancy is broken'
+
+
+    def _debug_check(self) -> None:
+        """Runs the indexes check if it's turned on in the config"""
+        if DEBUG_ACCOUNTING:
+            self._check_indexes()
      
 
     def _get_tracked_windows_of_ws(self, ws: int, skip_floating: bool=False) -> list[App]:
@@ -70,12 +245,9 @@ class WindowsAccount:
         Returns:
             list (App): list of windows
         """
-        ws_windows = []
-        for win in self.windows:
-            if win.w_current_ws == ws:
-                if skip_floating and win.w_floating in ['auto_on', 'user_on']:
-                    continue
-                ws_windows.append(win)
+        ws_windows = list(self._by_ws.get(ws, {}).values())
+        if skip_floating:
+            return [ win for win in ws_windows if not win.w_floating ]
         return ws_windows
 
 
@@ -89,14 +261,21 @@ class WindowsAccount:
         Returns:
             list (App): list of windows
         """
-        return [ win for win in self.windows if fullmatch(class_name, win.w_cls, IGNORECASE) is not None ]
+        # match only distinct classes, not every window
+        return [
+            win
+            for cls, wins in self._by_class.items()
+            if CLASSIFIER.matches(class_name, cls)
+            for win in wins.values()
+        ]
 
 
     def _get_new_container(self, w_con_id: int) -> con.Con | None:
         """The container, returned by the event handler,
         isn't integrated into a tree yet, thus stuff like
         parent or ws can be None, so it requires to find
-        this container again
+        this container again. Usually it's already in the
+        tree, if not - waits for it a bit
 
         Args:
             w_con_id (int): id of a container to look for
@@ -104,12 +283,7 @@ class WindowsAccount:
         Returns:
             con.Con | None: container object
         """
-        new_con = self.i3.get_tree().find_by_id(w_con_id)
-        if new_con is not None:
-            return new_con
-        # give it another try with a bit more time
-        sleep(0.2)
-        return self.i3.get_tree().find_by_id(w_con_id)
+        return self.tree.wait_for_con(w_con_id, NEW_CONTAINER_WAIT)
 
 
     def _move_window(self, win: App, ws: int=0, output: str|None=None) -> None|int:
@@ -143,17 +317,20 @@ class WindowsAccount:
                     f'move workspace to output {output if output is not None else win.w_current_output}; '
                     f'layout {new_win_con.parent.layout}'
                 )
+                # events about the move will come after the handler is done
+                self.tree.invalidate()
                 # for the proper switch to the new opened window we have to refresh the
                 # ws data right here (and it will be double refreshed later again)
                 self._update_ws(win.w_con_id)
                 return new_ws
             else:
                 new_win_con.command(f'move container to workspace {ws}; workspace {ws}')
+                self.tree.invalidate()
                 # if ws is given then we should check if moving from the scratchpad
                 # if so, toggle floating mode to detach from the scratchpad
                 if win.w_current_output == '__i3':
                     # it's floating
-                    if win.w_floating in ['auto_on', 'user_on']:
+                    if win.w_floating:
                         new_win_con.command('floating disable; floating enable')
                     else:
                         new_win_con.command('floating enable; floating disable')
@@ -163,25 +340,22 @@ class WindowsAccount:
         """Searches a window with given container id among
         already opened windows
         """
-        for win in self.windows:
-            if win.w_con_id == w_con_id:
-                return win
+        return self._by_con_id.get(w_con_id)
 
 
     def _get_tracked_window_by_win_id(self, w_win_id: int) -> App|None:
         """Searches a window with given window id among
         already opened windows
         """
-        for win in self.windows:
-            if win.w_win_id == w_win_id:
-                return win
+        return self._by_win_id.get(w_win_id)
 
 
     def _search_new_ws_for_window(self, app: App, output: str|None=None) -> int:
         """Apps have their predefined workspaces, but if the screen
         capacity is exceeded or conflicting with other apps on the same ws
-        a new ws should be found. We are gonna simply go from ws num 1 to
-        30, which is a sane number and see if can place our app somewhere.
+        a new ws should be found. It's the lowest ws where the app can be
+        placed, which isn't assigned to another screen and has no windows
+        on another screen. There is no upper limit of ws nums.
         It should also stay on the same screen, as it's now if output is
         not specified.
         If output specified, window will be placed there.
@@ -200,28 +374,28 @@ class WindowsAccount:
         """
         if output is None:
             output = app.w_default_output or app.w_current_output
-        ws_on_other_screens = []
+        return self._occupancy.free_ws(
+            output, app.w_sharing,
+            OUTPUTS.get(output, {}).get('capacity', 1),
+            reserved=self._reserved_ws(output)
+        )
+
+
+    @staticmethod
+    def _reserved_ws(output: str) -> int:
+        """Mask of workspaces assigned to other screens
+
+        Args:
+            output (str): the screen
+
+        Returns:
+            int: ws mask
+        """
         # we assume there can be more than one other screen
-        for output_name, output_prop in OUTPUTS.items():
-            if output_name == output:
-                continue
-            ws_on_other_screens += output_prop['ws']
-        for num in range(1, 31):
-            # ws is assigned on another screen
-            if num in ws_on_other_screens:
-                continue
-            # let's see if there are some windows on this ws
-            ws = self._get_tracked_windows_of_ws(num, skip_floating=True)
-            # if ws is empty - it's the result, which means it's
-            if not ws:
-                return num
-            # if ws isn't empty, we should check, if can place this app there
-            if not self._check_window_can_be_placed_to_ws(app, ws=num, output=output):
-                continue
-            return num
-        # unlikely we won't find a proper ws, but to prevent errors
-        # we are gonna return ws 99 as a backup
-        return 99
+        return ws_mask(
+            ws for output_name, output_prop in OUTPUTS.items()
+            if output_name != output for ws in output_prop['ws']
+        )
             
 
     def _get_window(self, window: con.Con, parent_id: int|None = None) -> App|None:
@@ -236,6 +410,33 @@ class WindowsAccount:
             App|None: window on None if container stopped to exist
         """
         w_container = self._get_new_container(window.id)
+        if w_container is None:
+            return
+        return self._make_app(
+            w_container, X_PROPERTIES.get(w_container.window),
+            self._get_term_app_ws(w_container.window), parent_id
+        )
+
+
+    def _make_app(
+        self, w_container: con.Con|None, properties: WindowProperties,
+        term_app_ws: int|None, parent_id: int|None = None
+    ) -> App|None:
+        """Creates a class for windows accounting from the facts
+        about a window
+
+        Args:
+            w_container (con.Con | None): window in it's container,
+                    taken from the tree
+            properties (WindowProperties): X properties of the window
+            term_app_ws (int | None): assigned ws of the terminal app,
+                    running in the window
+            parent_id (int | None, optional): if was detected that
+                    the given window has parent
+
+        Returns:
+            App|None: window on None if container stopped to exist
+        """
         # if window quickly despawned, w_container will be None,
         # also, seems like xfce panel has no ws num, exclude it too
         if (w_container is None or
@@ -246,41 +447,39 @@ class WindowsAccount:
         app = self.App(
             w_con_id=w_container.id,
             w_win_id=w_container.window,
-            w_cls=w_container.window_class,
+            w_cls=intern(w_container.window_class),
             w_current_ws=w_container.workspace().num,
-            w_floating=w_container.floating,
-            w_current_output=w_container.ipc_data['output'],
-            w_parent_id=parent_id     
+            w_floating=w_container.floating in self.FLOATING_ON,
+            w_current_output=intern(w_container.ipc_data['output']),
+            w_parent_id=parent_id,
+            w_pid=properties.pid
         )
         # now check if there are special settings for this app
-        for def_ass in DEFAULT_ASSIGNMENT:
-            # found match, add settings data to fields
-            if fullmatch(def_ass.name, app.w_cls, IGNORECASE) is not None:
-                app.w_default_ws = def_ass.ws
-                app.w_default_output = def_ass.output
-                app.w_sharing = def_ass.share_screen                
-                return app
+        def_ass = CLASSIFIER.classify(app.w_cls).assignment
+        # found match, add settings data to fields
+        if def_ass is not None:
+            app.w_default_ws = def_ass.ws
+            app.w_default_output = intern(def_ass.output) if def_ass.output is not None else None
+            app.w_sharing = def_ass.share_screen
+            return app
         # check if it's a terminal app
-        for term_app_name, term_app_ws in TERMINAL_APPS.items():
-            term_app_win_id = self._get_term_app_window_id(term_app_name)
-            if app.w_win_id == term_app_win_id:
-                # it has special ws despite terminal may be non banishing
-                app.w_default_ws = term_app_ws
-                break
+        if term_app_ws is not None:
+            # it has special ws despite terminal may be non banishing
+            app.w_default_ws = term_app_ws
+            app.w_terminal_app = True
         return app
 
 
     def _remove_window_from_accounting(self, w_con_id: int) -> None:
         """Searches the windows by it's id and removes
-        it from the list self.windows
+        it from the accounting
 
         Args:
             w_con_id (int): window to remove
         """
-        for win in self.windows:
-            if win.w_con_id == w_con_id:
-                self.windows.remove(win)
-                return
+        win = self._by_con_id.get(w_con_id)
+        if win is not None:
+            self._untrack(win)
 
 
     def _update_ws(self, w_con_id: int) -> None:
@@ -304,8 +503,7 @@ class WindowsAccount:
         # if window still exists, we can grab it's workspace
         # but we won't rewrite data if it was moved to the scratchpad,
         # which mean app keeps the old data about normal ws
-        app.w_current_ws = win_con.workspace().num
-        app.w_current_output = win_con.ipc_data['output']
+        self._relocate(app, win_con.workspace().num, intern(win_con.ipc_data['output']))
 
 
     def _check_window_should_be_moved(self, app: App) -> bool:
@@ -351,32 +549,156 @@ class WindowsAccount:
         Returns:
             bool: verdict
         """
-        ws_windows = self._get_tracked_windows_of_ws(ws, skip_floating=True)
         # if ws is empty, then no point for further checks
-        if not ws_windows:
+        if not self._occupancy.count(ws):
             return True
         # if new app or any of other apps don't want to share
         # the screen at all, then new app should be moved
-        if not app.w_sharing or not all([ other.w_sharing for other in ws_windows ]):
+        if not app.w_sharing or self._occupancy.has_non_sharing(ws):
             return False
         # now we can check if new app fits into the screen capacity
-        if len(ws_windows) < OUTPUTS[output]['capacity']:
-            return True
-        return False
+        return self._occupancy.count(ws) < OUTPUTS[output]['capacity']
+
+
+    def _get_term_app_ws(self, w_win_id: int, fresh: bool=False) -> int|None:
+        """Checks if any of terminal apps runs in the given window
+
+        Args:
+            w_win_id (int): window id of a terminal
+            fresh (bool, optional): read processes again instead of
+                    using the recent snapshot, for those who wait
+                    for an app to start
+
+        Returns:
+            int|None: assigned ws of the terminal app if found
+        """
+        if fresh:
+            PROCESSES.invalidate()
+        processes = PROCESSES.snapshot()
+        # the index is built once per processes snapshot
+        if processes is not self._term_app_snapshot:
+            self._term_app_windows, self._term_app_ancestors = self._index_term_apps(processes)
+            self._term_app_snapshot = processes
+        return self._term_app_ws_of(
+            w_win_id, self._match_term_app(w_win_id, self._term_app_windows, self._term_app_ancestors)
+        )
+
+
+    @staticmethod
+    def _match_term_app(
+        w_win_id: int, windows: dict[int, int], ancestors: list[tuple[set[int], int]]
+    ) -> tuple[int, int|None]|None:
+        """Looks for a terminal app of a window in an index made by
+        _index_term_apps. Reads nothing of the accounting, so probes
+        can call it out of the lane
+
+        Args:
+            w_win_id (int): window id of a terminal
+            windows (dict[int, int]): window id -> assigned ws
+            ancestors (list[tuple[set[int], int]]): ancestor pids
+                    of apps which don't know their window, with their ws
+
+        Returns:
+            tuple[int, int|None]|None: assigned ws of the app and, if
+                    the app was found by the process of the window, that
+                    process. None if there is no app
+        """
+        term_app_ws = windows.get(w_win_id)
+        if term_app_ws is not None:
+            return term_app_ws, None
+        if not ancestors:
+            return None
+        pid = X_PROPERTIES.get(w_win_id).pid
+        if pid is None:
+            return None
+        for chain, term_app_ws in ancestors:
+            if pid in chain:
+                return term_app_ws, pid
+
+
+    def _term_app_ws_of(self, w_win_id: int, match: tuple[int, int|None]|None) -> int|None:
+        """Checks a match of _match_term_app against the accounting.
+        The terminal didn't tell the window, then it's the window of
+        an ancestor process, if that process has no other windows
+
+        Args:
+            w_win_id (int): window id of a terminal
+            match (tuple[int, int | None] | None): the match
+
+        Returns:
+            int|None: assigned ws of the terminal app if found
+        """
+        if match is None:
+            return None
+        term_app_ws, pid = match
+        if pid is not None and any(win.w_win_id != w_win_id for win in self._by_pid.get(pid, {}).values()):
+            return None
+        return term_app_ws
+
 
+    @staticmethod
+    def _index_term_apps(processes: dict) -> tuple[dict[int, int], list[tuple[set[int], int]]]:
+        """Finds windows of all running terminal apps. A terminal
+        usually tells it's window to the apps it runs by WINDOWID
+        variable. If it doesn't, the window belongs to some ancestor
+        process of the app
+
+        Args:
+            processes (dict): pid -> process, a snapshot
 
-    def _get_term_app_window_id(self, app_name: str) -> int|None:
-        """Searches terminal app window id by the
-        given name
+        Returns:
+            tuple[dict[int, int], list[tuple[set[int], int]]]: window id ->
+                    assigned ws of the app and, for apps which don't know
+                    their window, ancestor pids of the app with it's ws
+        """
+        windows = {}
+        ancestors = []
+        for term_app_name, term_app_ws in TERMINAL_APPS.items():
+            for terminal_app_pid in pid_searcher(term_app_name):
+                w_win_id = find_window_by_pid(terminal_app_pid)
+                if w_win_id is not None:
+                    windows.setdefault(w_win_id, term_app_ws)
+                    continue
+                chain = set()
+                pid = processes[terminal_app_pid].ppid if terminal_app_pid in processes else None
+                while pid in processes and pid not in chain:
+                    chain.add(pid)
+                    pid = processes[pid].ppid
+                ancestors.append((chain, term_app_ws))
+        return windows, ancestors
+
+
+    def _get_window_of_process(
+        self, pid: int, processes: dict, skip: App|None=None, focused: int|None=None
+    ) -> App|None:
+        """Goes up the processes tree from a process and returns the
+        focused window of the first process which has windows, if the
+        focused one is it's, otherwise the oldest one. One process may
+        have windows on several ws, like firefox, and a new window is
+        opened from the one the user is in
 
         Args:
-            app_name (str): app name to look for
+            pid (int): process to start from
+            processes (dict): pid -> process, a snapshot
+            skip (App | None, optional): window to ignore
+            focused (int | None, optional): container id of
+                    the focused window
+
         Returns:
-            int|None: pid if found
+            App|None: window if found
         """
-        terminal_app_pid = pid_searcher(app_name)
-        if terminal_app_pid is not None:
-            return find_window_by_pid(terminal_app_pid)
+        seen = set()
+        while pid is not None and pid not in seen:
+            seen.add(pid)
+            windows = self._by_pid.get(pid, {})
+            win = windows.get(focused)
+            if win is not None and win is not skip:
+                return win
+            for win in windows.values():
+                if win is not skip:
+                    return win
+            process = processes.get(pid)
+            pid = process.ppid if process is not None else None
 
 
     def _show_ws_with_windows(self) -> None:
@@ -393,10 +715,7 @@ class WindowsAccount:
                 continue
             # to not leave an empty screen, we take all occupied ws of the
             # screen, and take the first one, sorted by the ws num
-            screen_wins = []
-            for window in self.windows:
-                if window.w_current_output == ws.output:
-                    screen_wins.append(window)
+            screen_wins = list(self._by_output.get(ws.output, {}).values())
             # if there are windows on the screen at all
             if screen_wins:
                 screen_wins.sort(key=lambda item: item.w_current_ws)
@@ -421,11 +740,14 @@ class WindowsAccount:
     def init_windows(self) -> None:
         """Loops over all existing windows to store the windows of interest
         """
-        for win in self.i3.get_tree().leaves():
+        for win in self.tree.get_tree().leaves():
             # we don't track pseudocontainers
             if win.window_class is None:
                 continue
-            self.windows.append(self._get_window(win))
+            app = self._get_window(win)
+            if app is not None:
+                self._track(app)
+        self._debug_check()
 
 
     def window_opened(self, window: con.Con, focused: int) -> None:
@@ -439,28 +761,72 @@ class WindowsAccount:
             focused (int): container id of the currently focused
                     window. Not the one is getting opened
         """
+        self.windows_opened([(window, focused)])
+
+
+    def windows_opened(self, opened: list[tuple[con.Con, int]]) -> None:
+        """window_opened for several windows, which were opened at
+        nearly the same time, like by a game launch. They are probed
+        together, placed one by one as if previous ones were already
+        moved, and all moves are sent to i3 at once
+
+        Args:
+            opened (list[tuple[con.Con, int]]): the opening windows, in
+                    the order they were opened, each with the container
+                    id of the window focused when it's event came. Not
+                    the one is getting opened. By the time the windows
+                    are placed the focus is already on the new ones
+        """
         # if a pseudocontainer
-        if window.window_class is None:
-            return
-        # if it's among so called NON_BANISHING_APPS, i.e. apps
-        # which require to have multiple windows for different tasks
-        # we are not gonna look for a parent
-        new_window = self._get_window(window)
-        if new_window is None:
+        opened = [ (window, focused) for window, focused in opened if window.window_class is not None ]
+        if not opened:
             return
-        self.windows.append(new_window)
-        # terminal apps are special cases because they run inside of a terminal
-        # window and terminal containing it should be moved to the predefined
-        # ws. Apps also require some time to launch, otherwise
-        # we can't distinguish what kind of terminal is getting opened
-        sleep(0.2)
-        for term_app_name, term_app_ws in TERMINAL_APPS.items():
-            term_app_win_id = self._get_term_app_window_id(term_app_name)
-            if new_window.w_win_id == term_app_win_id:
-                # it has special ws despite terminal may be non banishing
-                new_window.w_default_ws = term_app_ws
-                new_window.w_terminal_app = True
-                break
+        windows = [ window for window, _ in opened ]
+        # the container, X properties and terminal apps are probed at
+        # the same time. Terminal apps are special cases because they run
+        # inside of a terminal window and terminal containing it should be
+        # moved to the predefined ws. Apps also require some time to launch,
+        # so the probe waits for them, but only for terminals
+        plan = []
+        ws_to_out = None
+        for (window, focused), facts in zip(opened, self.enricher.enrich_many(windows)):
+            new_window = self._make_app(facts.container, facts.properties, facts.term_app_ws)
+            if new_window is None:
+                continue
+            self._track(new_window)
+            target = self._place_new_window(new_window, window, focused)
+            if target is None:
+                continue
+            if ws_to_out is None:
+                ws_to_out = self._ws_outputs()
+            ws, output = target
+            if output is None:
+                self._plan_move(new_window, plan, ws_to_out, ws, follow=True)
+            else:
+                self._plan_move(new_window, plan, ws_to_out, self._search_new_ws_for_window(new_window), output)
+        if plan:
+            self._run_plan(plan)
+        else:
+            self._debug_check()
+
+
+    def _place_new_window(
+        self, new_window: App, window: con.Con, focused: int
+    ) -> tuple[int, str|None]|None:
+        """Finds the parent of a new window and decides where
+        the window should go
+
+        Args:
+            new_window (App): the new window, already tracked
+            window (con.Con): the container from the event
+            focused (int): container id of the currently focused
+                    window. Not the one is getting opened
+
+        Returns:
+            tuple[int, str|None]|None: None if the window stays, the
+                    parent's ws if it goes there, or 0 and the output
+                    if a new ws has to be found for it
+        """
         # window can spawn two kind of windows - transient and actual child.
         # we consider both as children and have to check for both.
         # terminal apps are a special case again here, we don't expect
@@ -469,7 +835,15 @@ class WindowsAccount:
         # 1. Check for transient because it's easy
         if window.ipc_data['window_properties']['transient_for'] is not None:
             parent = self._get_tracked_window_by_win_id(window.ipc_data['window_properties']['transient_for'])
-        # 2. Check if window has leader window. Often applications have
+        # 2. Windows of one app belong to one process or it's ancestors,
+        # so the focused or the oldest window of the closest of them
+        # is the parent
+        elif not new_window.w_terminal_app and new_window.w_pid is not None:
+            parent = self._get_window_of_process(
+                new_window.w_pid, PROCESSES.snapshot(), skip=new_window, focused=focused
+            )
+        # 3. The window doesn't tell it's process. Check if window has
+        # leader window. Often applications have
         # invisible leader, acting like a daemon. In this case we are
         # gonna assume that focused window is the parent. But if there
         # is no leader, it's definitely not a child window of some app
@@ -494,29 +868,30 @@ class WindowsAccount:
             parent.w_con_id != new_window.w_con_id
         ):
             new_window.w_parent_id = parent.w_con_id
-        if any([ fullmatch(app, new_window.w_cls, IGNORECASE) for app in NON_BANISHING_APPS ]):
-            return
+        # if it's among so called NON_BANISHING_APPS, i.e. apps
+        # which require to have multiple windows for different tasks
+        if CLASSIFIER.classify(new_window.w_cls).non_banishing:
+            return None
         # if a new window was spawned by an existing one -
         # move new one on it's ws, unless the presumable
         # parent is already closed
         if new_window.w_parent_id is not None:
             # if new window is already on the proper ws
             if new_window.w_current_ws == parent.w_current_ws:
-                return
-            else:
-                # add a new window to it's presumable parent
-                self._move_window(new_window, parent.w_current_ws)
-                return
+                return None
+            # add a new window to it's presumable parent
+            return parent.w_current_ws, None
         # if the new window is floating and presumably has no parent,
         # nothing has to be done further
-        if new_window.w_floating in ['auto_on', 'user_on']:
-            return
+        if new_window.w_floating:
+            return None
         # we should banish window if the ws is full in it's output
         # capacity, or if new window or existing on this ws windows
         # dont' allow each other
         if self._check_window_should_be_moved(new_window):
-            self._move_window(new_window)
-    
+            return 0, new_window.w_current_output
+        return None
+
 
     def window_closed(self, window: con.Con) -> None:
         """Removes windows from accounting if it was there
@@ -524,12 +899,15 @@ class WindowsAccount:
         Args:
             window (con.Con): window which got closed
         """
+        # properties of a closed window are of no use anymore
+        X_PROPERTIES.forget(window.window)
         # this window could be someone's parent, remove this
         # yes, parent can be closed before his children
-        for win in self.windows:
+        for win in self._by_con_id.values():
             if win.w_parent_id == window.id:
                 win.w_parent_id = None
         self._remove_window_from_accounting(window.id)
+        self._debug_check()
 
 
     def window_moved(self, window: con.Con) -> None:
@@ -551,6 +929,7 @@ class WindowsAccount:
         else:
             for leaf in window.leaves():
                 self._update_ws(leaf.id)
+        self._debug_check()
 
 
     def window_floating_changed(self, window: con.Con) -> None:
@@ -563,203 +942,273 @@ class WindowsAccount:
         # if window is opened as floating, this event happens
         # before window opened, so beware
         if win is not None:
-            win.w_floating = window.floating
+            self._set_floating(win, window.floating in self.FLOATING_ON)
     
 
-    def go_default(self) -> None:
-        """Reassigns accounted windows to their default workspaces
-        and outputs. Doesn't solve conflicts because it will require
-        very heavy logic
-        """
-
-        def win_upd_ws_output(win: WindowsAccount.App, ws: int, output: str) -> None:
-            """Updates attributes
-
-            Args:
-                win (WindowsAccount.App): window
-                ws (int): probably new ws
-                output (str): probably new output
-            """
-            setattr(win, 'w_current_ws', ws)
-            setattr(win, 'w_current_output', output)
-
-        # terminal apps live in a terminal, if launched at all. Find it's ids
-        # xray_id = self._get_xray_window_id()
-        # we should get what ws is where. Some are predefined
-        # in the config, but not all of them
-        # map ws to the output name
+    def _ws_outputs(self) -> dict[int, str]:
+        """Maps workspaces to outputs. Assigned ones are taken
+        from the config, the rest - from where they are now
+
+        Returns:
+            dict[int, str]: ws num -> output name
+        """
         ws_to_out = {}
-        # map ws to the it's capacity
-        ws_to_cap = {}
         for out, props in OUTPUTS.items():
             for ws in props['ws']:
                 ws_to_out[ws] = out
-                ws_to_cap[ws] = props['capacity']
-        for ws in self.i3.get_tree().workspaces():
+        for ws in self.tree.workspaces():
             # skip named, if exist
             if ws.num == -1:
                 continue
-            if ws_to_out.get(ws.num) is None:
-                ws_to_out[ws.num] = ws.ipc_data['output']
-        # move all child windows to a wm ws99, thus we can move
-        # them to their parents later, but do it virtually
+            ws_to_out.setdefault(ws.num, ws.ipc_data['output'])
+        return ws_to_out
+
+
+    def _shadow(self) -> 'WindowsAccount':
+        """Makes a copy of the accounting with copies of all
+        windows, so moves can be planned without touching
+        the real state
+
+        Returns:
+            WindowsAccount: the copy
+        """
+        shadow = WindowsAccount(self.i3, self.tree, self.enricher)
+        for win in self._by_con_id.values():
+            shadow._track(replace(win))
+        return shadow
+
+
+    def _plan_move(
+        self, win: App, plan: list[str], ws_to_out: dict[int, str],
+        ws: int, output: str|None=None, follow: bool=False
+    ) -> None:
+        """The planning twin of _move_window. Doesn't send anything
+        to i3, adds the commands to the plan and changes the window
+        as if it was already moved
+
+        Args:
+            win (App): window
+            plan (list[str]): commands planned so far
+            ws_to_out (dict[int, str]): ws num -> output name
+            ws (int): ws where to move window to
+            output (str | None, optional): if given, the ws is
+                    also moved to this screen
+            follow (bool, optional): switch to the ws, when it's
+                    not moved to another screen
+        """
+        criteria = f'[con_id={win.w_con_id}]'
+        if output is not None:
+            win_con = self.tree.find_by_id(win.w_con_id)
+            layout = win_con.parent.layout if win_con is not None else 'default'
+            # always switch to the moving ws, otherwise the other one,
+            # currently focused will be moved
+            plan.append(
+                f'{criteria} move container to workspace {ws}; workspace {ws}; '
+                f'move workspace to output {output}; layout {layout}'
+            )
+        else:
+            output = ws_to_out.get(ws, win.w_current_output)
+            plan.append(f'{criteria} move container to workspace {ws}' + (f'; workspace {ws}' if follow else ''))
+            # toggle floating mode to detach from the scratchpad
+            if win.w_current_output == '__i3':
+                if win.w_floating:
+                    plan.append(f'{criteria} floating disable; {criteria} floating enable')
+                else:
+                    plan.append(f'{criteria} floating enable; {criteria} floating disable')
+        self._relocate(win, ws, output)
+        ws_to_out.setdefault(ws, output)
+
+
+    def _run_plan(self, plan: list[str]) -> None:
+        """Sends planned commands in batches, each batch is one
+        request, then takes the real windows state from the tree
+
+        Args:
+            plan (list[str]): commands
+        """
+        for start in range(0, len(plan), self.PLAN_BATCH):
+            self.i3.command('; '.join(plan[start:start + self.PLAN_BATCH]))
+        self.tree.invalidate()
         for win in self.windows:
-            if win.w_parent_id is not None:
-                win.w_current_ws = 99
-        # loop over all windows and place them according to ws
-        # and output settings, where ws is more priority
+            self._update_ws(win.w_con_id)
+        self._debug_check()
+
+
+    def _solve_default(self, ws_to_out: dict[int, str]) -> dict[int, tuple[int, str|None]]:
+        """Computes the final layout of "go default" at once, so every
+        window is moved at most one time and only if it has to be.
+        The rules are:
+            - a window with assigned ws goes there, unless it's a non
+            banishing app and a window of the same class is already there
+            - a window with assigned output, which is on another screen,
+            goes to a new ws on that screen
+            - the rest stay where they are
+            - on every ws assigned windows stay. Other windows stay as long
+            as sharing rules and the screen capacity allow, in the order
+            they were opened. Those which don't fit go to a new ws
+            - child windows go to the final ws of their parents
+        A new ws is the lowest ws on the screen which the window fits in,
+        taking into account the final layout, not the current one
+
+        Args:
+            ws_to_out (dict[int, str]): ws num -> output name
+
+        Returns:
+            dict[int, tuple[int, str|None]]: container id of a window to move
+                    -> ws where it goes and the output, if it goes to a new ws
+        """
+        def capacity(ws: int) -> int:
+            return OUTPUTS.get(ws_to_out.get(ws), {}).get('capacity', 1)
+
+        def settle(win: WindowsAccount.App, ws: int) -> None:
+            # floating windows don't take the place
+            if not win.w_floating:
+                final.setdefault(ws, []).append(win)
+                occupancy.add(ws, None, win.w_sharing, False)
+
+        def final_ws(win: WindowsAccount.App, depth: int=0) -> int:
+            # a parent can be a child too. Depth protects from loops
+            if win.w_con_id in targets:
+                return targets[win.w_con_id][0]
+            parent = self._get_tracked_window_by_con_id(win.w_parent_id)
+            if parent is None or depth > len(self._by_con_id):
+                return win.w_current_ws
+            return final_ws(parent, depth + 1)
+
+        def find_free_ws(win: WindowsAccount.App, output: str) -> int:
+            # ws on other screens can't be taken
+            reserved = 0
+            for other, mask in screens.items():
+                if other != output:
+                    reserved |= mask
+            return occupancy.free_ws(
+                output, win.w_sharing,
+                OUTPUTS.get(output, {}).get('capacity', 1), reserved
+            )
+
+        # ws -> non floating windows which end up there
+        final = {}
+        # the same, counted for the free ws search
+        occupancy = Occupancy()
+        # output -> mask of it's workspaces
+        screens = {}
+        for ws, out in ws_to_out.items():
+            screens[out] = screens.get(out, 0) | ws_mask((ws,))
+        targets = {}
+        # windows without a place yet, with the screen they should go to
+        homeless = []
+        children = []
         for win in self.windows:
-            if win.w_current_ws == 99:
+            if (win.w_parent_id is not None and
+                self._get_tracked_window_by_con_id(win.w_parent_id) is not None):
+                children.append(win)
                 continue
-            # # process our special case - xray
-            # if xray_id is not None and win.w_win_id == xray_id and win.w_current_ws != XRAY_WS:
-            #     self._move_window(win, ws=XRAY_WS)
-            #     continue
-            if win.w_default_ws and win.w_current_ws != win.w_default_ws:
+            if win.w_default_ws:
+                if win.w_current_ws == win.w_default_ws:
+                    settle(win, win.w_current_ws)
+                    continue
                 # if it's non banishing app, we don't move a window
                 # if a window of the same class is already there
-                if any([ fullmatch(app, win.w_cls, IGNORECASE) for app in NON_BANISHING_APPS ]):
-                    target_ws_wins = self._get_tracked_windows_of_ws(win.w_default_ws)
-                    if win.w_cls in [ other.w_cls for other in target_ws_wins ]:
-                        continue
-                self._move_window(win, ws=win.w_default_ws)
-                # update win props
-                win_upd_ws_output(win, win.w_default_ws, ws_to_out[win.w_default_ws])
-                # don't check the output settings, because ws has more priority
-                continue
+                same_class_there = any([
+                    other.w_cls == win.w_cls
+                    for other in self._get_tracked_windows_of_ws(win.w_default_ws)
+                ])
+                if not (same_class_there and
+                        CLASSIFIER.classify(win.w_cls).non_banishing):
+                    targets[win.w_con_id] = (win.w_default_ws, None)
+                    settle(win, win.w_default_ws)
+                    continue
             # if ws isn't set but the output is and windows isn't there
-            if (win.w_default_output is not None and
-                win.w_current_output != win.w_default_output):
-                # move window to a proper output. _move_window returns the new ws
-                new_ws = self._move_window(win, output=win.w_default_output)
-                # update properties. they will be updated anyway, but we need it now
-                win_upd_ws_output(win, new_ws, win.w_default_output)
-        # go through all and move conflicting windows:
-        # get all occupied ws except named and 99, which contains those who have a parent
-        all_ws = [ ws for ws in self.i3.get_tree().workspaces() if not ws.num in [-1, 99] ]
-        # loop over all occupied
-        for num in range(1, all_ws[-1].num + 1):
-            # all windows, already sitting on the ws
-            vacant_ws_wins = self._get_tracked_windows_of_ws(num, skip_floating=True)
-            if not vacant_ws_wins:
+            elif (win.w_default_output is not None and
+                  win.w_current_output != win.w_default_output):
+                homeless.append((win, win.w_default_output))
                 continue
-            # those with assigned ws
-            assigned_wins = [ win for win in vacant_ws_wins if win.w_default_ws == num ]
-            # if an assigned window is non sharing - we don't care, they stay
-            non_sharing_assigned = False
-            non_sharing_wins = []
-            # loop over all ws windows
-            for win in vacant_ws_wins:
-                # find all non sharing windows which aren't assigned to this ws
-                if win.w_sharing == False:
-                    if win.w_default_ws != num:
-                        non_sharing_wins.append(win)
-                    # or there is a window which isn't sharing but assigned to ws
-                    else:
-                        non_sharing_assigned = True
-            # if there is any assigned window, move all non sharing
-            if assigned_wins:
-                for win in non_sharing_wins:
-                    new_ws = self._move_window(win)
-                    win_upd_ws_output(win, new_ws, win.w_default_output)
-            # if there is any non sharing and no assigned - move all other
-            elif non_sharing_wins:
-                # remove this non sharing from the list of ws wins
-                vacant_ws_wins.remove(non_sharing_wins[0])
-                for win in vacant_ws_wins:
-                    new_ws = self._move_window(win)
-                    win_upd_ws_output(win, new_ws, win.w_default_output)
+            settle(win, win.w_current_ws)
+        # resolve conflicts, named ws and the scratchpad aren't touched
+        for ws in sorted(final):
+            if ws < 1:
                 continue
-            # filter all windows which aren't assigned to this ws
-            all_other_wins = [ win for win in vacant_ws_wins if win not in assigned_wins ]
-            # get the capacity which remains after all assigned windows took their place
-            capacity_remains = ws_to_cap.get(num, 1) - len(assigned_wins)
-            if not all_other_wins:
+            assigned = [ win for win in final[ws] if win.w_default_ws == ws ]
+            others = [ win for win in final[ws] if win.w_default_ws != ws ]
+            if not others:
                 continue
-            # if no more capacity remains, or there is a non sharing window
-            if capacity_remains <= 0 or non_sharing_assigned:
-                # move all other windows
-                for win in all_other_wins:
-                    new_ws = self._move_window(win)
-                    win_upd_ws_output(win, new_ws, win.w_default_output)
-            # move those which don't fit into the capacity
-            elif len(all_other_wins) > capacity_remains:
-                for win in all_other_wins[capacity_remains:]:
-                    new_ws = self._move_window(win)
-                    win_upd_ws_output(win, new_ws, win.w_default_output)
-        # if there are any child windows
-        ws99 = self._get_tracked_windows_of_ws(99)
-        # move them to their parents. Capacity or non sharing stuff
-        # aren't taken into account in this case
-        if ws99:
-            for win in ws99:
-                # find where the parent is, take into account the possibility
-                # of possible errors when parent doesn't exist, it shouldn't happen though
-                parent = self._get_tracked_window_by_con_id(win.w_parent_id)
-                new_ws = self._move_window(win, parent.w_current_ws if parent is not None else 0)
-                if new_ws != parent.w_current_ws:
-                    win_upd_ws_output(win, new_ws, win.w_default_output)
-        # now we have to fill gaps in ws sequences if they exist
-        # to fill them we are gonna take windows only from the same output
-        output_ws_wins = {}
-        # get the list of ws on each output
-        for ws in self.i3.get_tree().workspaces():
-            output_ws_wins.setdefault(ws.ipc_data['output'], []).append(ws.num)
-        # for each screen
-        for output, ws_list in output_ws_wins.items():
-            # check if there are more ws that one, otherwise makes no sense
-            # to continue, go to other screen
-            if len(ws_list) <= 1:
-                continue
-            # prepare the list of ws and gaps, it's just a sequence from 1
-            # to maximum existing ws, with ws, assigned or located to another
-            # screen removed. +1 is necessary because range doesn't take the last one
-            ws_seq = list(range(1, ws_list[-1] + 1))
-            # remove assigned to another screen
-            for ws, out in ws_to_out.items():
-                if output != out and ws in ws_seq:
-                    ws_seq.remove(ws)
-            # remove those used on another screen
-            for all_screen_ws in output_ws_wins.values():
-                # skip this screen
-                if all_screen_ws == ws_list:
-                    continue
-                # remove ws located on other screens
-                for ws in all_screen_ws:
-                    if ws in ws_list:
-                        ws_list.remove(ws)
-            # now we try to fill gaps taking windows from other ws,
-            # starting from the tail
-            for seq_num, ws in enumerate(ws_seq):
-                ws_wins = self._get_tracked_windows_of_ws(ws)
-                # if capacity is exceeded - skip
-                if len(ws_wins) >= OUTPUTS[output]['capacity']:
-                    continue
-                # if there are non sharing windows - skip
-                if not all(win.w_sharing for win in ws_wins):
-                    continue
-                # starting from the tail not taking current ws
-                for ws_target in ws_seq[seq_num:][::-1]:
-                    # get windows of a target ws
-                    target_ws_wins = self._get_tracked_windows_of_ws(ws_target)
-                    # we should remove those, which are assigned to the target ws
-                    target_ws_wins = [ win for win in target_ws_wins if win.w_default_ws is None ]
-                    # it can happen there are no windows left - skip
-                    if not target_ws_wins:
-                        continue
-                    # now we can try to move the rest
-                    for win in target_ws_wins:
-                        new_win_ws = self._search_new_ws_for_window(win)
-                        # if we can't move the window in any gap - skip
-                        if new_win_ws >= win.w_current_ws:
-                            continue
-                        self._move_window(win, new_win_ws)
+            if assigned:
+                # a non sharing assigned window takes the whole ws,
+                # otherwise sharing ones fill the remaining capacity
+                if all(win.w_sharing for win in assigned):
+                    kept = [ win for win in others if win.w_sharing ][:max(0, capacity(ws) - len(assigned))]
+                else:
+                    kept = []
+            else:
+                # the first non sharing window stays alone
+                non_sharing = [ win for win in others if not win.w_sharing ]
+                kept = non_sharing[:1] if non_sharing else others[:capacity(ws)]
+            final[ws] = assigned + kept
+            for win in others:
+                if win not in kept:
+                    homeless.append((win, None))
+                    occupancy.remove(ws, None, win.w_sharing, False)
+        # find new places against the final layout
+        for win, output in homeless:
+            output = output or win.w_default_output or win.w_current_output
+            ws = find_free_ws(win, output)
+            targets[win.w_con_id] = (ws, output)
+            settle(win, ws)
+            if ws not in ws_to_out:
+                ws_to_out[ws] = output
+                screens[output] = screens.get(output, 0) | ws_mask((ws,))
+        # children follow their parents. Capacity or non sharing
+        # stuff aren't taken into account in this case
+        for win in children:
+            ws = final_ws(win)
+            if ws >= 1 and ws != win.w_current_ws:
+                targets[win.w_con_id] = (ws, None)
+        return targets
+
+
+    def _plan_default(self, ws_to_out: dict[int, str]) -> list[str]:
+        """Turns the solved layout into commands, only for windows
+        which have to be moved. Changes windows as if they were moved,
+        so should be called on a shadow copy of the accounting
+
+        Args:
+            ws_to_out (dict[int, str]): ws num -> output name
+
+        Returns:
+            list[str]: commands to send to i3
+        """
+        plan = []
+        targets = self._solve_default(ws_to_out)
+        for win in self.windows:
+            if win.w_con_id in targets:
+                ws, output = targets[win.w_con_id]
+                self._plan_move(win, plan, ws_to_out, ws, output)
+        return plan
+
+
+    def go_default(self, dry_run: bool=False) -> list[str]:
+        """Reassigns accounted windows to their default workspaces
+        and outputs. The final layout is solved first on a copy of
+        the accounting, then only the moves which are really needed
+        are sent to i3 in batches
+
+        Args:
+            dry_run (bool, optional): only plan, don't move anything
+
+        Returns:
+            list[str]: planned commands
+        """
+        plan = self._shadow()._plan_default(self._ws_outputs())
+        if dry_run:
+            return plan
+        self._run_plan(plan)
         # to not leave an empty screen, call function to look for an
         # occupied ws
         self._show_ws_with_windows()
+        return plan
 
 
-    def move_left_right(self, binding_name: str, win: con.Con) -> None:
+    def move_left_right(self, binding_name: str, win: con.Con|None) -> None:
         """Moves selected container to another screen without
         specification if the exact ws. If the moving container
         has the only non floating window, it will be placed
@@ -769,12 +1218,13 @@ class WindowsAccount:
 
         Args:
             binding_name (str): left, right
-            win (con.Con): target window
+            win (con.Con|None): target window, None if
+                    nothing is focused
         """
         # get output name from the config
         output_name = LEFT_RIGHT.get(binding_name)
-        # if it wasn't configured
-        if output_name is None:
+        # if it wasn't configured or there is nothing to move
+        if output_name is None or win is None:
             return
         # if it's a pseudocontainer
         if win.window_class is None:
@@ -803,19 +1253,24 @@ class WindowsAccount:
         self._show_ws_with_windows()
             
 
-    def hide_steam(self, steam: con.Con) -> None:
+    def hide_steam(self, steam_id: int) -> None:
         """moves steam to scratchpad if it was activated
         over a game window
 
         Args:
-            steam (con.Con): steam window
+            steam_id (int): container id of the steam window. Not the
+                    container, in the asyncio mode it's commands are
+                    coroutines
         """
-        steam_win = self._get_tracked_window_by_con_id(steam.id)
+        steam_win = self._get_tracked_window_by_con_id(steam_id)
+        if steam_win is None:
+            return
         steam_ws = self._get_tracked_windows_of_ws(steam_win.w_current_ws)
         # if game and steam share one ws, hide steam
         for win in steam_ws:
             if it_is_a_game(win.w_cls):
-                steam.command('move scratchpad')
+                self.i3.command(f'[con_id={steam_id}] move scratchpad')
+                self.tree.invalidate()
                 break
 
 
@@ -828,7 +1283,7 @@ class WindowsAccount:
         if not steam:
             return
         # look for steam on scratchpad
-        steam_in_scr = self.i3.get_tree().scratchpad().find_classed('steam')
+        steam_in_scr = self.tree.scratchpad().find_classed('steam')
         if steam_in_scr:
             sleep(1)
             # bring in a normal ws all windows if possible
@@ -853,8 +1308,8 @@ class WindowsAccount:
             compositor_manager (CompositorManager): initialized instance
         """
         # check if any game is still launched
-        for win in self.windows:
-            if it_is_a_game(win.w_cls):
+        for cls in self._by_class:
+            if it_is_a_game(cls):
                 return
         # no games found, start the services
         compositor_manager.postponed_compositor_starter()
@@ -867,3 +1322,25 @@ class WindowsAccount:
             compositor_manager (CompositorManager): initialized instance
         """
         compositor_manager.postponed_compositor_killer()
+
+
+class AsyncWindowsAccount:
+# The asyncio face of WindowsAccount. The accounting talks to i3 with blocking
+# requests and sleeps while windows settle, so it runs on the job pool, in the
+# accounting lane. The lane keeps the order of changes as events came and the
+# event loop stays free
+
+    def __init__(self, windows_account: WindowsAccount, jobs: JobPool) -> None:
+        self.account = windows_account
+        self.jobs = jobs
+
+    async def run(self, func, *args):
+        """Runs any blocking function in the accounting lane
+
+        Args:
+            func (callable): function to run
+
+        Returns:
+            whatever the function returns
+        """
+        return await asyncio.wrap_future(self.jobs.submit(WindowsAccount.JOB_KEY, func, *args))
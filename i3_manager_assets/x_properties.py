@@ -0,0 +1,193 @@
+import re
+import subprocess
+from threading import Lock
+from dataclasses import dataclass
+
+# python-xlib is optional, without it properties are read by xprop
+try:
+    from Xlib import X, display as xdisplay, error as xerror
+except ImportError:
+    xdisplay = None
+
+
+@dataclass(slots=True, frozen=True)
+class WindowProperties:
+    """X properties of a window, which tell about it's relatives
+
+        client_leader: WM_CLIENT_LEADER, the leader window of the
+                app, often an invisible one
+        pid: _NET_WM_PID, the process which owns the window
+        transient_for: WM_TRANSIENT_FOR, the window a dialog belongs to
+    """
+    client_leader: int|None = None
+    pid: int|None = None
+    transient_for: int|None = None
+
+
+class XProperties:
+    """Reads window properties over one X connection, which is opened
+    once and kept. Properties of a window are read once and cached
+    until the window is closed, the caller has to tell about it by
+    forget(). If python-xlib isn't installed or the display can't
+    be opened, properties are read by xprop
+    """
+    NAMES = ('WM_CLIENT_LEADER', '_NET_WM_PID', 'WM_TRANSIENT_FOR')
+    # windows to remember, in case some close events were missed
+    CACHE_SIZE = 4096
+    # 'WM_CLIENT_LEADER(WINDOW): window id # 0x5c00001'
+    # '_NET_WM_PID(CARDINAL) = 12345'
+    XPROP_LINE = re.compile(r'^(\w+)\(\w+\)(?: = |: window id # )(0x[0-9a-f]+|\d+)', re.MULTILINE)
+
+    def __init__(self) -> None:
+        # windows are opened and closed on different threads
+        self._lock = Lock()
+        self._display = None
+        # property name -> atom
+        self._atoms = {}
+        # xlib failed once, don't try again
+        self._no_xlib = xdisplay is None
+        # window id -> properties
+        self._cache = {}
+
+    def get(self, win_id: int) -> WindowProperties:
+        """Returns properties of a window
+
+        Args:
+            win_id (int): X window id
+
+        Returns:
+            WindowProperties: properties, missing ones are None
+        """
+        with self._lock:
+            props = self._cache.get(win_id)
+            if props is None:
+                props = self._read_xlib(win_id)
+                if props is None:
+                    props = self._read_xprop(win_id)
+                if len(self._cache) >= self.CACHE_SIZE:
+                    # the oldest one
+                    del self._cache[next(iter(self._cache))]
+                self._cache[win_id] = props
+            return props
+
+    def forget(self, win_id: int) -> None:
+        """Drops the cached properties of a closed window
+
+        Args:
+            win_id (int): X window id
+        """
+        with self._lock:
+            self._cache.pop(win_id, None)
+
+    def root_string(self, name: str) -> str|None:
+        """Reads a string property of the root window, like
+        I3_SOCKET_PATH. It's not cached, it changes when i3 restarts
+
+        Args:
+            name (str): property name
+
+        Returns:
+            str|None: the value or None if there is no such property
+        """
+        with self._lock:
+            display = self._connect()
+            if display is not None:
+                try:
+                    atom = display.intern_atom(name)
+                    prop = display.screen().root.get_full_property(atom, X.AnyPropertyType)
+                except xerror.ConnectionClosedError:
+                    self._display = None
+                else:
+                    if prop is None or not len(prop.value):
+                        return None
+                    value = prop.value
+                    if isinstance(value, bytes):
+                        value = value.decode(errors='replace')
+                    return value.rstrip('\0')
+        try:
+            result = subprocess.run(
+                ['xprop', '-root', name],
+                text=True,
+                capture_output=True,
+                check=True
+            ).stdout
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            return None
+        # 'I3_SOCKET_PATH(UTF8_STRING) = "/run/user/1000/i3/ipc-socket.1234"'
+        # or 'I3_SOCKET_PATH:  not found.'
+        _, found, value = result.partition(' = ')
+        if not found:
+            return None
+        return value.strip().strip('"') or None
+
+    def _connect(self):
+        """Returns the display, opens it if it's not opened yet
+
+        Returns:
+            Display|None: display or None if xlib can't be used
+        """
+        if self._display is None and not self._no_xlib:
+            try:
+                self._display = xdisplay.Display()
+                self._atoms = { name: self._display.intern_atom(name) for name in self.NAMES }
+            # no DISPLAY or no access to it
+            except (xerror.DisplayError, xerror.ConnectionClosedError, OSError):
+                self._no_xlib = True
+        return self._display
+
+    def _read_xlib(self, win_id: int) -> WindowProperties|None:
+        """Reads properties over the X connection
+
+        Returns:
+            WindowProperties|None: properties or None if
+                    there is no connection
+        """
+        display = self._connect()
+        if display is None:
+            return None
+        window = display.create_resource_object('window', win_id)
+        values = {}
+        try:
+            for name, atom in self._atoms.items():
+                prop = window.get_full_property(atom, X.AnyPropertyType)
+                values[name] = prop.value[0] if prop is not None and len(prop.value) else None
+        # the window is already destroyed
+        except (xerror.BadWindow, xerror.BadDrawable):
+            return WindowProperties()
+        # X server has gone, try again with a new connection next time
+        except xerror.ConnectionClosedError:
+            self._display = None
+            return None
+        return self._from_values(values)
+
+    def _read_xprop(self, win_id: int) -> WindowProperties:
+        """Reads properties by xprop
+
+        Returns:
+            WindowProperties: properties
+        """
+        try:
+            result = subprocess.run(
+                ['xprop', '-id', str(win_id), *self.NAMES],
+                text=True,
+                capture_output=True,
+                check=True
+            ).stdout
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            return WindowProperties()
+        # missing properties look like 'WM_CLIENT_LEADER:  not found.'
+        return self._from_values({
+            name: int(value, 0) for name, value in self.XPROP_LINE.findall(result)
+        })
+
+    @staticmethod
+    def _from_values(values: dict[str, int|None]) -> WindowProperties:
+        return WindowProperties(
+            client_leader=values.get('WM_CLIENT_LEADER') or None,
+            pid=values.get('_NET_WM_PID') or None,
+            transient_for=values.get('WM_TRANSIENT_FOR') or None
+        )
+
+
+# the only instance, all modules use it
+X_PROPERTIES = XProperties()
@@ -2,118 +2,76 @@
 
 # The script shows current i3 binding mode via
 # notifications. Replaces same feature of i3 bar
+# Run with --aio to handle events on asyncio, where slow
+# windows accounting doesn't hold status updates
 
 import subprocess
-from traceback import format_exc
-from pyperclip import paste
-from re import fullmatch, IGNORECASE
+import asyncio
+import sys
+from traceback import format_exc, format_exception
+from concurrent.futures import Future
 from i3ipc import Connection, Event, con
-from time import sleep
-from pyautogui import write
-from i3_manager_assets.windows_account import WindowsAccount
+from i3ipc.aio import Connection as AioConnection
+from i3_manager_assets.windows_account import WindowsAccount, AsyncWindowsAccount
+from i3_manager_assets.tree_mirror import TreeMirror
+from i3_manager_assets.job_pool import JobPool, Batcher
+from i3_manager_assets.classifier import CLASSIFIER
+from i3_manager_assets.notifications import NOTIFIER
+from i3_manager_assets.status import OneScreen, StatusRenderer, make_sinks
+from i3_manager_assets.i3_socket import find_socket_path
 from i3_manager_assets.additional_funcs import (
-    make_backup, fix_particles, sendmessage,
-    CompositorManager, it_is_a_game, ersatz_clipboard_paste
+    make_backup, fix_particles, sendmessage, sendmessage_async,
+    CompositorManager, AsyncCompositorManager, it_is_a_game,
+    ersatz_clipboard_paste
 )
 from i3_manager_assets.config import (
-    BACKUPS, GENMON_OUTPUT_MAPPING, COLORS,
-    NOTIFICATION_CLASS, NOP_SHORTCUTS, EXCHANGE_SCREENS,
-    VIDEOPLAYER
+    NOTIFICATION_CLASS, NOP_SHORTCUTS, EXCHANGE_SCREENS, VIDEOPLAYER,
+    JOB_WORKERS, STATUS_SINKS, NEW_WINDOW_BATCH, I3_SOCKET_WAIT
 )
 
 
 #################### just shared variables ###################
-# Notification container
+# Notification container id, when notifications are shown by notify-send.
+# Only the id, containers of the asyncio events can't be commanded
+# by the blocking connection
 NOTIFICATION_CON = None
+# id of the binding mode notification, 0 if there is none
+MODE_NOTIFICATION = 0
+# sends screens states to genmons and other sinks, one frame of changes at once
+renderer = StatusRenderer(make_sinks(STATUS_SINKS))
 # A currently active binding mode. Assume that it's default because 
 # there is no way to request it, only listen to events
 BINDING_MODE = 'default'
 # All actual screens. Supposed to hold references to OneScreen
 SCREENS = {}
+# the key of the job pool lane which updates layout indicators
+# in the asyncio mode, the tree may have to be fetched for them
+BINDING_MODES_JOB_KEY = 'binding modes'
 # since there is no way to distinguish a new window parent, then we
 # have to assume that if a new window and focused window have the
 # same class, very likely the focused window is the parent
 # of that new window. So we are gonna store it's id
 FOCUSED = 0
               
-# contains an information about a screen state for quick output
-class OneScreen:
-    """This class is responsible for tracking the state
-    which should be shown on a screen. That "default|h|5".
-    One screen - one instance
-    """
-
-    def __init__(self, name: str, active_ws: str|None=None, split_type: str|None=None) -> None:
-        # turns screen output name into a file name which starts with i3
-        self.name = f'/tmp/i3_{name}'
-        # currently active workspace
-        self.active_ws = active_ws
-        # h or v for the output
-        self._split_type = split_type
-        # splith or splitv, the inner i3ipc value. Required, so we can
-        # check, if any changes happened and don't rewrite a file
-        self.inner_split_type = None
-        # take the proper genmon name from settings
-        self.genmon = GENMON_OUTPUT_MAPPING[name]
-
-    @property
-    def split_type(self) -> str | None:
-        return self._split_type
-
-    @split_type.setter
-    def split_type(self, value: str) -> None:
-        """Basically shortens the inner identifiers
-
-        Args:
-            value (str): the value, used by i3
-        """
-        match value:
-            case 'splitv':
-                self._split_type = 'v'
-            case 'splith':
-                self._split_type = 'h'
-            case 'tabbed':
-                self._split_type = 't'
-            case 'stacked':
-                self._split_type = 's'
-        self.inner_split_type = value                
-
-    def write_state(self) -> None:
-        """Forms a colorized string and writes it to a file,
-        calls the refresh command on a proper genmon
-        """
-        with open(self.name, 'w+') as f:
-            color = COLORS.get(BINDING_MODE, '#E34234')
-            f.write(f'<txt><span foreground="{color}"> {BINDING_MODE}</span> ⬩ {self.split_type} ⬩ {self.active_ws} </txt>')
-        # refresh the genmon, the process result and output isn't interesting
-        subprocess.Popen(
-            ['xfce4-panel', f'--plugin-event={self.genmon}:refresh:bool:true'],
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL
-        )
-
 ####################### initialization ############################
 
 # Create the Connection object that can be used to send commands and subscribe
 # to events. Connection() without parameters may not work sometimes. Find the socket
 # for the robustness. Also give i3 some time to get up in a case the script is
 # called not from i3 config, but, for example, as a systemd unit
-# do 10 attempts to get the socket
-socket_path = ''
-for _ in range(10):
-    try:
-        socket_path = str(subprocess.check_output(["i3", "--get-socketpath"]).decode().strip())
-        # we got the socket, no need to wait anymore
-        break
-    # if i3 is not running yet, subprocess.CalledProcessError will return non-zero exit code
-    except subprocess.CalledProcessError:
-        sleep(1)
-# if i3 didn't open it's socket within 10 seconds
-if not socket_path:
+socket_path = find_socket_path(I3_SOCKET_WAIT)
+# if i3 didn't open it's socket in time
+if socket_path is None:
     exit(1)
 i3 = Connection(socket_path)
+# local copy of the tree, fed by events. All handlers read from it
+tree = TreeMirror(i3)
 picom_manager = CompositorManager(timer_delay=5)
-windows_account = WindowsAccount(i3)
+windows_account = WindowsAccount(i3, tree)
+# blocking side effects of events go there
+jobs = JobPool(JOB_WORKERS)
+# new windows events of a burst are handled together
+new_windows = Batcher(NEW_WINDOW_BATCH, lambda events: to_windows_lane(on_windows_new, i3, events))
 windows_account.init_windows()
 
 def get_screens() -> None:
@@ -129,29 +87,66 @@ def get_screens() -> None:
     for ws in i3.get_workspaces():
         if ws.visible:
             SCREENS[ws.output].active_ws = ws.num
-    for ws in i3.get_tree().workspaces():
+    for ws in tree.workspaces():
         for screen in SCREENS.values():
             if screen.active_ws == ws.num:
                 screen.split_type = ws.layout
-                screen.write_state()
+                renderer.mark(screen)
 
 ####################### helper functions ##############################
 
+def report_error(job: Future) -> None:
+    """Job pool callback, shows a job failure the same way
+    the main loop does
+    """
+    if job.exception() is not None:
+        sendmessage('ERROR', ''.join(format_exception(job.exception())), urgency='critical')
+
+
+def report_result(title: str, timeout: str):
+    """Makes a job pool callback, which shows the text,
+    returned by a job, as a notification
+
+    Args:
+        title (str): notification title
+        timeout (str): notification timeout
+    """
+    def callback(job: Future) -> None:
+        if job.exception() is not None:
+            report_error(job)
+        else:
+            sendmessage(title, job.result(), timeout)
+    return callback
+
+
+def to_windows_lane(func, *args) -> Future:
+    """Hands a blocking function to the windows accounting lane
+    of the job pool, so the event loop isn't blocked by it
+    """
+    # new windows, which are still collected, came earlier
+    new_windows.flush()
+    return jobs.submit(WindowsAccount.JOB_KEY, func, *args, on_done=report_error)
+
+
 def rewrite_all_binding_modes() -> None:
     """Updates binding mode for all screens/files because the mode is global
     """
     for v in SCREENS.values():
-        v.write_state()
+        v.mode = BINDING_MODE
+    renderer.mark(*SCREENS.values())
 
 
 def close_old_notification() -> None:
     """Closes the current, binding mode related notification and
-    sets NOTIFICATION_CON to default
+    sets NOTIFICATION_CON and MODE_NOTIFICATION to default
     """
-    # if NOTIFICATION_CON has a reference to a container - the notification has to be killed
-    global NOTIFICATION_CON
-    if isinstance(NOTIFICATION_CON, con.Con):
-        NOTIFICATION_CON.command('kill')
+    global NOTIFICATION_CON, MODE_NOTIFICATION
+    if MODE_NOTIFICATION:
+        NOTIFIER.close_notification(MODE_NOTIFICATION)
+        MODE_NOTIFICATION = 0
+    # if NOTIFICATION_CON has an id of a container - the notification has to be killed
+    if isinstance(NOTIFICATION_CON, int):
+        i3.command(f'[con_id={NOTIFICATION_CON}] kill')
     # set to default
     NOTIFICATION_CON = None
 
@@ -168,19 +163,32 @@ def update_binding_modes(focused: con.Con) -> None: # checked
     # refresh a file if layout changed
     if SCREENS[output].inner_split_type != layout:
         SCREENS[output].split_type = layout
-        SCREENS[output].write_state()      
+        renderer.mark(SCREENS[output])
+
+def refresh_binding_modes() -> None:
+    """Updates the layout indicator of the focused container.
+    Reads the focus from the tree, which may have to be fetched
+    """
+    focused = tree.find_focused()
+    # i3 may tell no focused container at all
+    if focused is not None:
+        update_binding_modes(focused)
 
 ############################ event handlers #############################
 
 def on_mode_change(i3, e) -> None:
     """Handler of mode change event
     """
-    global NOTIFICATION_CON, BINDING_MODE
-    # close a notification from the previous binding mode if happened to be on
-    close_old_notification()
+    global NOTIFICATION_CON, BINDING_MODE, MODE_NOTIFICATION
     # for the genmon we should take only the first word of a binding mode name
     # and show the rest in a notification
     new_mode = e.change.split('[')
+    # close a notification from the previous binding mode if happened to be on.
+    # A long mode replaces it instead
+    replaced = MODE_NOTIFICATION
+    if len(new_mode) < 2 or not replaced:
+        close_old_notification()
+        replaced = 0
     match len(new_mode):
         # this shouldn't happen, but if it happened then better to know about it
         case 0:
@@ -191,44 +199,52 @@ def on_mode_change(i3, e) -> None:
             rewrite_all_binding_modes()
         # long string modes like launch for example
         case _:
-            # make this variable not None so on_window_new will catch the notification window reference
-            NOTIFICATION_CON = ''
             BINDING_MODE = new_mode[0].strip()
             rewrite_all_binding_modes()
             # split mode name ('Launch [f]irefox [c]hrome') to the mode name and it's bindings (if any)
             # so we can show it in notification with a title and a list of options
-            sendmessage(BINDING_MODE, '[' + '\n['.join(new_mode[1:]), urgency='critical')
-
-
-def on_window_new(i3, e) -> None:
-    """Handler of opening new windows event, saves the container
-    into a global variable, if the container belongs to notification daemon,
-    saves app class to FOR_BACKUP if the app requires a backup
+            MODE_NOTIFICATION = NOTIFIER.notify(
+                BINDING_MODE, '[' + '\n['.join(new_mode[1:]), urgency='critical',
+                replaces=replaced, coalesce=False
+            )
+            # it was shown by notify-send and can be closed only by killing it's window.
+            # Make this variable not None so on_windows_new will catch the window reference
+            if not MODE_NOTIFICATION:
+                NOTIFICATION_CON = ''
+
+
+def on_windows_new(i3, events: list) -> None:
+    """Handler of opening new windows events, which came together.
+    Places the windows at once, saves the container into a global
+    variable, if the container belongs to notification daemon.
+    Events come with the window which was focused when they came,
+    when the batch runs the new windows already have the focus
     """
     global NOTIFICATION_CON
     # if it's not any window of interest
-    if e.container.window_class is None:
-        return
-    windows_account.window_opened(e.container, FOCUSED)
-    # if there is some game - steam one or a native one,
-    # turn off picom and redshift
-    if it_is_a_game(e.container.window_class):
-        # kill picom. The function will decide if it's necessary
-        windows_account.stop_eye_candy_services(picom_manager)
-        return
-    # grab only notifications and only if it's expected when NOTIFICATION_CON is ''
-    if NOTIFICATION_CON == '' and e.container.window_class.lower() == NOTIFICATION_CLASS:
-        NOTIFICATION_CON = e.container
-        return
-    # if video player is opened, switch to it's ws
-    if fullmatch(VIDEOPLAYER, e.container.window_class, IGNORECASE):
-        # get all player windows
-        player = windows_account._get_tracked_windows_by_class(VIDEOPLAYER)
-        for win in player:
-            # switch to the ws, containing one, which was opened in this event.
-            if win.w_con_id == e.container.id:
-                i3.command(f'workspace {win.w_current_ws}')
+    events = [ (e, focused) for e, focused in events if e.container.window_class is not None ]
+    if not events:
         return
+    windows_account.windows_opened([ (e.container, focused) for e, focused in events ])
+    for e, _ in events:
+        # if there is some game - steam one or a native one,
+        # turn off picom and redshift
+        if it_is_a_game(e.container.window_class):
+            # kill picom. The function will decide if it's necessary
+            windows_account.stop_eye_candy_services(picom_manager)
+            continue
+        # grab only notifications and only if it's expected when NOTIFICATION_CON is ''
+        if NOTIFICATION_CON == '' and e.container.window_class.lower() == NOTIFICATION_CLASS:
+            NOTIFICATION_CON = e.container.id
+            continue
+        # if video player is opened, switch to it's ws
+        if CLASSIFIER.classify(e.container.window_class).videoplayer:
+            # get all player windows
+            player = windows_account._get_tracked_windows_by_class(VIDEOPLAYER)
+            for win in player:
+                # switch to the ws, containing one, which was opened in this event.
+                if win.w_con_id == e.container.id:
+                    i3.command(f'workspace {win.w_current_ws}')
 
 
 def on_workspace_focus(i3, e) -> None:
@@ -237,7 +253,7 @@ def on_workspace_focus(i3, e) -> None:
     output = e.current.ipc_data['output']
     if SCREENS[output].active_ws != e.current.name:
         SCREENS[output].active_ws = e.current.name
-        SCREENS[output].write_state()
+        renderer.mark(SCREENS[output])
 
 
 def on_window_close(i3, e) -> None:
@@ -251,12 +267,19 @@ def on_window_close(i3, e) -> None:
     windows_account.window_closed(e.container)
     # check if the closing app requires backup. It also makes sense
     # only if it's the last this app window
-    for app_name_pattern in BACKUPS.keys():
-        if fullmatch(app_name_pattern, e.container.window_class, IGNORECASE):
-            # look for other windows of this class, if non - make backup
-            if not windows_account._get_tracked_windows_by_class(app_name_pattern):
-                sendmessage('Backup results', make_backup(app_name_pattern), '4000')
-            return
+    app_name_pattern = CLASSIFIER.classify(e.container.window_class).backup
+    if app_name_pattern is not None:
+        # look for other windows of this class, if non - make backup
+        if not windows_account._get_tracked_windows_by_class(app_name_pattern):
+            # backups of one app are never made at the same time. If one
+            # is running already, the next one waits and there is no
+            # point to queue more than one
+            jobs.submit(
+                app_name_pattern, make_backup, app_name_pattern,
+                on_done=report_result('Backup results', '4000'),
+                coalesce=True
+            )
+        return
     # check if a game is exited
     if it_is_a_game(e.container.window_class):
         # fix particles in ini, if it's ps2
@@ -277,62 +300,84 @@ def on_window_focus(i3, e) -> None:
     global FOCUSED
     # to get the correct layout of a container, we have to take it from it's parent
     # the reason isn't really obvious. Unless it's a workspace
-    focused = i3.get_tree().find_focused()
-    if focused.window_class is None:
+    focused = tree.find_focused()
+    if focused is None or focused.window_class is None:
         return
     # this is the only way to intercept Steam from appearing over game
     if focused.window_class.lower() == 'steam':
-        windows_account.hide_steam(e.container)
+        to_windows_lane(windows_account.hide_steam, e.container.id)
     update_binding_modes(focused)
     FOCUSED = focused.id
 
 
+def run_nop_shortcut(shortcut: str) -> None:
+    """Performs the action of a nop shortcut from NOP_SHORTCUTS
+
+    Args:
+        shortcut (str): action name
+    """
+    match shortcut:
+        case 'go_default':
+            windows_account.go_default()
+            sendmessage('Go default', 'Applications were brought to their assigned workspaces', '2700')
+        case 'open_mpv':
+            # pyperclip is loaded only by those who need it
+            from pyperclip import paste
+            mpv = subprocess.Popen(['mpv', paste()], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            sendmessage('mpv from clipboard', f'mpv was opened with pid {mpv.pid}', urgency='critical')
+        case 'exchange_screens':
+            # search for visible workspaces, save their ids
+            visible_ws = []
+            for ws in i3.get_workspaces():
+                if ws.visible and ws.output in EXCHANGE_SCREENS:
+                    visible_ws.append(ws.ipc_data['id'])
+            # we can command to children windows of a ws.
+            # but first get actual containers from ids
+            ws_cons = []
+            for ws_id in visible_ws:
+                # we don't work with such
+                # if any of these workspaces are named - return
+                if (ws_con := tree.find_by_id(ws_id)).num == -1:
+                    return
+                ws_cons.append(ws_con)
+            # use temporary ws99 as a buffer
+            ws_cons[1].command_children('move container to workspace 99')
+            ws_cons[0].command_children(f'move container to workspace {ws_cons[1].num}')
+            # the moves will come as events only after this handler
+            tree.invalidate()
+            # find ws99 container
+            for ws in tree.workspaces():
+                if ws.num == 99:
+                    ws.command_children(f'move container to workspace {ws_cons[0].num}')
+                    tree.invalidate()
+                    break
+        case 'move_to_left':
+            windows_account.move_left_right('move_to_left', tree.find_focused())
+        case 'move_to_right':
+            windows_account.move_left_right('move_to_right', tree.find_focused())
+        case 'paste_clipboard':
+            ersatz_clipboard_paste()
+        case 'probe_stats':
+            stats = windows_account.enricher.stats()
+            lines = [
+                f"{name}: {probe['runs']} runs, average {probe['average'] * 1000:.0f} ms, "
+                f"the longest {probe['longest'] * 1000:.0f} ms, the last {probe['last'] * 1000:.0f} ms"
+                for name, probe in stats.items()
+            ]
+            sendmessage('New windows probes', '\n'.join(lines) or 'No windows were opened yet', '10000')
+
+
 def on_binding_change(i3, e) -> None:
     """Binding change handler. Excludes mode changes,
     the processing is equal to on_window_focus
     """
     if e.binding.command.startswith('nop'):
-        shortcut = (*e.binding.event_state_mask, e.binding.symbol)
-        match NOP_SHORTCUTS.get(shortcut):
-            case 'go_default':
-                windows_account.go_default()
-                sendmessage('Go default', 'Applications were brought to their assigned workspaces', '2700')
-            case 'open_mpv':
-                mpv = subprocess.Popen(['mpv', paste()], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-                sendmessage('mpv from clipboard', f'mpv was opened with pid {mpv.pid}', urgency='critical')
-            case 'exchange_screens':
-                # search for visible workspaces, save their ids
-                visible_ws = []
-                for ws in i3.get_workspaces():
-                    if ws.visible and ws.output in EXCHANGE_SCREENS:
-                        visible_ws.append(ws.ipc_data['id'])
-                # we can command to children windows of a ws.
-                # but first get actual containers from ids
-                ws_cons = []
-                for ws_id in visible_ws:
-                    # we don't work with such
-                    # if any of these workspaces are named - return
-                    if (ws_con := i3.get_tree().find_by_id(ws_id)).num == -1:
-                        return
-                    ws_cons.append(ws_con)
-                # use temporary ws99 as a buffer
-                ws_cons[1].command_children('move container to workspace 99')
-                ws_cons[0].command_children(f'move container to workspace {ws_cons[1].num}')
-                # find ws99 container
-                for ws in i3.get_tree().workspaces():
-                    if ws.num == 99:
-                        ws.command_children(f'move container to workspace {ws_cons[0].num}')
-                        break
-            case 'move_to_left':
-                windows_account.move_left_right('move_to_left', i3.get_tree().find_focused())
-            case 'move_to_right':
-                windows_account.move_left_right('move_to_right', i3.get_tree().find_focused())
-            case 'paste_clipboard':
-                ersatz_clipboard_paste()
-            case _:
-                return
+        shortcut = NOP_SHORTCUTS.get((*e.binding.event_state_mask, e.binding.symbol))
+        if shortcut is None:
+            return
+        to_windows_lane(run_nop_shortcut, shortcut)
     if 'mode' not in e.binding.command:
-        update_binding_modes(i3.get_tree().find_focused())
+        refresh_binding_modes()
 
 
 def on_window_move(i3, e) -> None:
@@ -342,23 +387,132 @@ def on_window_move(i3, e) -> None:
 def on_window_floating(i3, e) -> None:
     windows_account.window_floating_changed(e.container)
 
+####################### asyncio handlers ##############################
+# In the asyncio mode the status handlers stay as they are, they are
+# cheap. Those which may fetch the tree hand it to the job pool. Everything
+# touching windows accounting goes to it's lane of the job pool, so a slow
+# window or backup doesn't freeze the status of all screens
+
+async def in_windows_lane(func, *args) -> None:
+    """Runs a blocking function in the accounting lane, reports
+    errors the same way the blocking main loop does
+    """
+    new_windows.flush()
+    try:
+        await windows_lane.run(func, *args)
+    except Exception:
+        await sendmessage_async('ERROR', format_exc(), urgency='critical')
+
+
+async def on_mode_change_async(aio_i3, e) -> None:
+    # notifications are shown and closed by blocking bus and i3
+    # calls. The lane also keeps them in order with new windows,
+    # which look for the notification window
+    await in_windows_lane(on_mode_change, i3, e)
+
+
+async def on_window_new_async(aio_i3, e) -> None:
+    new_windows.add((e, FOCUSED))
+
+
+async def on_window_close_async(aio_i3, e) -> None:
+    await in_windows_lane(on_window_close, i3, e)
+
+
+async def on_window_move_async(aio_i3, e) -> None:
+    await in_windows_lane(windows_account.window_moved, e.container)
+
+
+async def on_window_floating_async(aio_i3, e) -> None:
+    await in_windows_lane(windows_account.window_floating_changed, e.container)
+
+
+async def on_window_focus_async(aio_i3, e) -> None:
+    global FOCUSED
+    # the event tells the focused window, only the layout
+    # needs the tree, it's read in the job pool
+    if e.container.window_class is None:
+        return
+    FOCUSED = e.container.id
+    jobs.submit(BINDING_MODES_JOB_KEY, refresh_binding_modes, on_done=report_error, coalesce=True)
+    if e.container.window_class.lower() == 'steam':
+        await in_windows_lane(windows_account.hide_steam, e.container.id)
+
+
+async def on_binding_change_async(aio_i3, e) -> None:
+    if e.binding.command.startswith('nop'):
+        shortcut = NOP_SHORTCUTS.get((*e.binding.event_state_mask, e.binding.symbol))
+        if shortcut is None:
+            return
+        await in_windows_lane(run_nop_shortcut, shortcut)
+    if 'mode' not in e.binding.command:
+        jobs.submit(BINDING_MODES_JOB_KEY, refresh_binding_modes, on_done=report_error, coalesce=True)
+
+####################### entry points ##############################
+
+def main() -> None:
+    """The classic mode, handlers are called one by one
+    by the i3ipc main loop, the slow ones just hand their
+    work to the job pool
+    """
+    # Subscribe to events. The mirror goes first, so other
+    # handlers see the tree already updated by the event
+    tree.subscribe()
+    # handlers touching windows accounting run in the job pool
+    i3.on(Event.MODE, on_mode_change)
+    i3.on(Event.WINDOW_NEW, lambda i3, e: new_windows.add((e, FOCUSED)))
+    i3.on(Event.WORKSPACE_FOCUS, on_workspace_focus)
+    i3.on(Event.WINDOW_CLOSE, lambda i3, e: to_windows_lane(on_window_close, i3, e))
+    i3.on(Event.WINDOW_FOCUS, on_window_focus)
+    i3.on(Event.BINDING, on_binding_change)
+    i3.on(Event.WINDOW_MOVE, lambda i3, e: to_windows_lane(on_window_move, i3, e))
+    i3.on(Event.WINDOW_FLOATING, lambda i3, e: to_windows_lane(on_window_floating, i3, e))
+    # Start the main loop and wait for events to come in.
+    try:
+        i3.main()
+    except Exception:
+        sendmessage('ERROR', format_exc(), urgency='critical')
+    finally:
+        jobs.shutdown()
+        renderer.close()
+
+
+async def main_async() -> None:
+    """The asyncio mode. Events come through i3ipc.aio, requests and
+    commands still go through the blocking connection, but only from
+    the job pool
+    """
+    global picom_manager, windows_lane
+    picom_manager = AsyncCompositorManager(asyncio.get_running_loop(), timer_delay=5)
+    windows_lane = AsyncWindowsAccount(windows_account, jobs)
+    aio_i3 = await AioConnection(socket_path).connect()
+    tree.subscribe(aio_i3)
+    aio_i3.on(Event.MODE, on_mode_change_async)
+    aio_i3.on(Event.WINDOW_NEW, on_window_new_async)
+    aio_i3.on(Event.WORKSPACE_FOCUS, on_workspace_focus)
+    aio_i3.on(Event.WINDOW_CLOSE, on_window_close_async)
+    aio_i3.on(Event.WINDOW_FOCUS, on_window_focus_async)
+    aio_i3.on(Event.BINDING, on_binding_change_async)
+    aio_i3.on(Event.WINDOW_MOVE, on_window_move_async)
+    aio_i3.on(Event.WINDOW_FLOATING, on_window_floating_async)
+    try:
+        await aio_i3.main()
+    except Exception:
+        await sendmessage_async('ERROR', format_exc(), urgency='critical')
+    finally:
+        jobs.shutdown()
+        renderer.close()
+
 
 # Initialize files for xfce4 genmons
 get_screens()
 # initialize the variable. Can happen that it will be
 # a workspace, instead of a window, but it won't
 # change anything to the logic
-FOCUSED = i3.get_tree().find_focused().id
-# Subscribe to events
-i3.on(Event.MODE, on_mode_change)
-i3.on(Event.WINDOW_NEW, on_window_new)
-i3.on(Event.WORKSPACE_FOCUS, on_workspace_focus)
-i3.on(Event.WINDOW_CLOSE, on_window_close)
-i3.on(Event.WINDOW_FOCUS, on_window_focus)
-i3.on(Event.BINDING, on_binding_change)
-i3.on(Event.WINDOW_MOVE, on_window_move)
-# Start the main loop and wait for events to come in.
-try:
-    i3.main()
-except Exception:
-    sendmessage('ERROR', format_exc(), urgency='critical')
+FOCUSED = tree.find_focused().id
+# awaitable windows accounting for the asyncio mode
+windows_lane = None
+if '--aio' in sys.argv[1:]:
+    asyncio.run(main_async())
+else:
+    main()